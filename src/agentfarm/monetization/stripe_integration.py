@@ -2,18 +2,81 @@ from __future__ import annotations
 
 """Stripe integration for subscriptions and payments."""
 
+import asyncio
 import hashlib
 import hmac
 import json
 import logging
 import os
 import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
 from typing import Any
 
 from pydantic import BaseModel, Field
 
+try:
+    import httpx
+except ImportError:
+    httpx = None  # type: ignore
+
+# Optional: orjson parses bytes directly and is several times faster than json
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+# Upper bound on webhook bodies we are willing to hash (Stripe events are a few KB)
+MAX_WEBHOOK_BYTES = 1024 * 1024
+
+# Payloads up to this size are verified inline; larger ones in a worker thread
+INLINE_VERIFY_MAX_BYTES = 64 * 1024
+
+# Per-request timeout (seconds) for calls to the Stripe API
+STRIPE_API_TIMEOUT = 10.0
+
+# Longest accepted webhook timestamp; Unix seconds fit in 10 digits until 2286
+MAX_TIMESTAMP_DIGITS = 12
+
+# Number of processed event IDs remembered for duplicate detection
+MAX_SEEN_EVENTS = 10_000
+
+# Tokens granted per legacy token pack product
+TOKEN_PACK_AMOUNTS: dict[str, int] = {
+    "token_pack_small": 500,
+    "token_pack_medium": 2000,
+    "token_pack_large": 5000,
+}
+
+# Constant parts of webhook action results
+_UPGRADE_EARLY_ACCESS: dict[str, Any] = {"action": "upgrade_tier", "tier": "early_access"}
+_DOWNGRADE_FREE: dict[str, Any] = {"action": "downgrade_tier", "tier": "free"}
+
+_UNKNOWN_PRODUCT = ("", "payment")
+
+
+def _parse_sig_header(signature: str) -> tuple[str, list[str]]:
+    """Extract the ``t`` value and every ``v1`` value from a Stripe-Signature header.
+
+    Stripe sends several ``v1`` entries while a signing secret is being
+    rolled, so all of them are returned. Only the first ``t`` is used.
+    A missing timestamp is returned as an empty string.
+    """
+    timestamp = ""
+    v1: list[str] = []
+    for item in signature.split(","):
+        key, _, value = item.partition("=")
+        if key == "t":
+            if not timestamp:
+                timestamp = value
+        elif key == "v1":
+            v1.append(value)
+    return timestamp, v1
+
 
 class StripeConfig(BaseModel):
     """Stripe configuration."""
@@ -36,8 +99,14 @@ class StripeConfig(BaseModel):
     cancel_url: str = Field(default="http://localhost:8080/?payment=cancelled")
 
 
-class StripeEvent(BaseModel):
-    """Parsed Stripe webhook event."""
+@dataclass(slots=True, frozen=True)
+class StripeEvent:
+    """Parsed Stripe webhook event.
+
+    A plain dataclass rather than a pydantic model: it is built from an
+    already signature-verified payload on every webhook, so field
+    validation buys nothing.
+    """
 
     id: str
     type: str
@@ -45,7 +114,8 @@ class StripeEvent(BaseModel):
     created: int
 
 
-class CheckoutSession(BaseModel):
+@dataclass(slots=True, frozen=True)
+class CheckoutSession:
     """Stripe checkout session info."""
 
     id: str
@@ -86,6 +156,44 @@ class StripeIntegration:
 
         self._enabled = bool(self.config.secret_key and self.config.webhook_secret)
 
+        # The webhook secret is fixed for the process lifetime, so run the HMAC
+        # key schedule once and clone the keyed state per verification.
+        self._webhook_key = self.config.webhook_secret.encode("utf-8")
+        self._hmac_proto = hmac.new(self._webhook_key, digestmod=hashlib.sha256)
+
+        # Shared HTTP client for the Stripe API (created lazily)
+        self._http_client: httpx.AsyncClient | None = None
+        self._http_client_lock = asyncio.Lock()
+
+        # product_type -> (price_id, checkout mode)
+        self._products: dict[str, tuple[str, str]] = {
+            "beta_operator": (self.config.beta_operator_price_id, "payment"),
+            "prompt_pack": (self.config.prompt_pack_price_id, "payment"),
+            "early_access": (self.config.early_access_price_id, "subscription"),
+        }
+        # Legacy token packs
+        for size, price_id in self.config.token_pack_price_ids.items():
+            self._products[f"token_pack_{size}"] = (price_id, "payment")
+
+        # Checkout form fields that are the same for every session
+        self._checkout_base: dict[str, str] = {
+            "line_items[0][quantity]": "1",
+            "success_url": self.config.success_url,
+            "cancel_url": self.config.cancel_url,
+        }
+
+        # Recently processed event IDs, oldest first
+        self._seen_events: OrderedDict[str, None] = OrderedDict()
+
+        # Webhook event type -> handler
+        self._event_handlers: dict[str, Callable[[StripeEvent], dict[str, Any]]] = {
+            "checkout.session.completed": self._handle_checkout_completed,
+            "customer.subscription.updated": self._handle_subscription_updated,
+            "customer.subscription.deleted": self._handle_subscription_deleted,
+            "invoice.payment_succeeded": self._handle_payment_succeeded,
+            "invoice.payment_failed": self._handle_payment_failed,
+        }
+
     @property
     def enabled(self) -> bool:
         """Check if Stripe is properly configured."""
@@ -104,34 +212,59 @@ class StripeIntegration:
         if not self._enabled:
             return False
 
-        try:
-            # Parse signature header
-            elements = dict(item.split("=", 1) for item in signature.split(","))
-            timestamp = elements.get("t", "")
-            expected_sig = elements.get("v1", "")
-
-            if not timestamp or not expected_sig:
-                return False
+        timestamp, expected_sigs = _parse_sig_header(signature)
+        if not timestamp or not expected_sigs:
+            return False
 
-            # Check timestamp (reject if older than 5 minutes)
-            if abs(time.time() - int(timestamp)) > 300:
-                logger.warning("Stripe webhook timestamp too old")
-                return False
+        # Reject malformed, stale or oversized requests before hashing.
+        # isascii() also rules out non-ASCII digits that isdigit() accepts,
+        # and the length cap keeps int() below its digit-count limit.
+        if not (
+            len(timestamp) <= MAX_TIMESTAMP_DIGITS
+            and timestamp.isascii()
+            and timestamp.isdigit()
+        ):
+            return False
 
-            # Compute expected signature
-            signed_payload = f"{timestamp}.{payload.decode('utf-8')}"
-            computed_sig = hmac.new(
-                self.config.webhook_secret.encode("utf-8"),
-                signed_payload.encode("utf-8"),
-                hashlib.sha256,
-            ).hexdigest()
+        expected_digests = []
+        for expected_sig in expected_sigs:
+            try:
+                expected_digests.append(bytes.fromhex(expected_sig))
+            except ValueError:
+                continue
+        if not expected_digests:
+            return False
 
-            return hmac.compare_digest(computed_sig, expected_sig)
+        # Check timestamp (reject if older than 5 minutes)
+        if abs(time.time() - int(timestamp)) > 300:
+            logger.warning("Stripe webhook timestamp too old")
+            return False
 
-        except Exception as e:
-            logger.error(f"Webhook signature verification failed: {e}")
+        if len(payload) > MAX_WEBHOOK_BYTES:
+            logger.warning("Stripe webhook payload too large: %d bytes", len(payload))
             return False
 
+        # Compute expected signature
+        # Stripe signs "<timestamp>.<raw body>"; build it as bytes so the
+        # body is hashed as-is without a decode/encode round-trip.
+        signed_payload = timestamp.encode("ascii") + b"." + payload
+        mac = self._hmac_proto.copy()
+        mac.update(signed_payload)
+
+        # Compare raw 32-byte digests rather than their hex encodings
+        digest = mac.digest()
+        return any(hmac.compare_digest(digest, expected) for expected in expected_digests)
+
+    async def _verify_webhook_signature_async(self, payload: bytes, signature: str) -> bool:
+        """Verify a webhook signature without stalling the event loop.
+
+        Hashing a typical webhook takes microseconds, so small payloads are
+        verified inline; only large ones are offloaded to a thread.
+        """
+        if len(payload) <= INLINE_VERIFY_MAX_BYTES:
+            return self.verify_webhook_signature(payload, signature)
+        return await asyncio.to_thread(self.verify_webhook_signature, payload, signature)
+
     def parse_webhook_event(self, payload: bytes) -> StripeEvent | None:
         """Parse webhook payload into StripeEvent.
 
@@ -142,15 +275,19 @@ class StripeIntegration:
             Parsed event or None if invalid
         """
         try:
-            data = json.loads(payload)
+            data = _json_loads(payload)
+            # Only allocate an empty default when the object is actually missing
+            inner = data.get("data")
+            obj = inner.get("object") if inner else None
             return StripeEvent(
                 id=data["id"],
                 type=data["type"],
-                data=data.get("data", {}).get("object", {}),
+                data=obj or {},
                 created=data.get("created", 0),
             )
-        except (json.JSONDecodeError, KeyError) as e:
-            logger.error(f"Failed to parse webhook event: {e}")
+        except (ValueError, KeyError) as e:
+            # ValueError covers both json.JSONDecodeError and orjson.JSONDecodeError
+            logger.error("Failed to parse webhook event: %s", e)
             return None
 
     async def handle_webhook(self, payload: bytes, signature: str) -> dict[str, Any]:
@@ -161,12 +298,18 @@ class StripeIntegration:
             signature: Stripe-Signature header
 
         Returns:
-            Dict with action to take: {"action": "...", "device_id": "...", ...}
+            Dict with action to take: {"action": "...", "device_id": "...", ...}.
+            Handled events carry "event_id"; pass it to mark_processed() once
+            the action has been applied.
         """
+        if not self._enabled:
+            logger.warning("handle_webhook: Stripe not configured, ignoring webhook")
+            return {"action": "disabled", "error": "Stripe not configured"}
+
         logger.info("handle_webhook: Verifying signature (secret starts with: %s...)",
                     self.config.webhook_secret[:10] if self.config.webhook_secret else "EMPTY")
 
-        if not self.verify_webhook_signature(payload, signature):
+        if not await self._verify_webhook_signature_async(payload, signature):
             logger.error("handle_webhook: Signature verification FAILED")
             logger.error("handle_webhook: signature header = %s", signature[:50] if signature else "EMPTY")
             return {"action": "invalid_signature", "error": "Signature verification failed"}
@@ -178,37 +321,49 @@ class StripeIntegration:
             logger.error("handle_webhook: Failed to parse event from payload")
             return {"action": "parse_error", "error": "Failed to parse event"}
 
-        logger.info(f"Processing Stripe event: {event.type}")
-
-        # Handle different event types
-        if event.type == "checkout.session.completed":
-            return self._handle_checkout_completed(event)
-        elif event.type == "customer.subscription.updated":
-            return self._handle_subscription_updated(event)
-        elif event.type == "customer.subscription.deleted":
-            return self._handle_subscription_deleted(event)
-        elif event.type == "invoice.payment_succeeded":
-            return self._handle_payment_succeeded(event)
-        elif event.type == "invoice.payment_failed":
-            return self._handle_payment_failed(event)
-        else:
-            logger.debug(f"Unhandled event type: {event.type}")
+        logger.info("Processing Stripe event: %s", event.type)
+
+        handler = self._event_handlers.get(event.type)
+        if handler is None:
+            logger.debug("Unhandled event type: %s", event.type)
             return {"action": "ignored", "event_type": event.type}
 
+        # Stripe retries deliveries; don't apply the same event twice
+        seen = self._seen_events
+        if event.id in seen:
+            seen.move_to_end(event.id)
+            logger.info("Skipping duplicate Stripe event: %s", event.id)
+            return {"action": "duplicate", "event_id": event.id}
+
+        # Handlers build a fresh dict per call, so it is safe to extend
+        result = handler(event)
+        result["event_id"] = event.id
+        return result
+
+    def mark_processed(self, event_id: str) -> None:
+        """Record that a webhook event's action has been applied.
+
+        Called by the webhook endpoint once the result of handle_webhook has
+        been applied, so a delivery that fails part-way is not treated as a
+        duplicate when Stripe retries it.
+        """
+        seen = self._seen_events
+        seen[event_id] = None
+        if len(seen) > MAX_SEEN_EVENTS:
+            seen.popitem(last=False)
+
     def _handle_checkout_completed(self, event: StripeEvent) -> dict[str, Any]:
         """Handle successful checkout session."""
-        session_data = event.data
-        device_id = session_data.get("client_reference_id", "")
-        mode = session_data.get("mode", "")
-        metadata = session_data.get("metadata", {})
-        product_type = metadata.get("product_type", "")
-        customer_id = session_data.get("customer", "")
+        get = event.data.get
+        device_id = get("client_reference_id", "")
+        mode = get("mode", "")
+        product_type = get("metadata", {}).get("product_type", "")
+        customer_id = get("customer", "")
 
         if mode == "subscription":
             return {
-                "action": "upgrade_tier",
+                **_UPGRADE_EARLY_ACCESS,
                 "device_id": device_id,
-                "tier": "early_access",
                 "stripe_customer_id": customer_id,
             }
         elif mode == "payment":
@@ -241,11 +396,10 @@ class StripeIntegration:
 
     def _handle_subscription_updated(self, event: StripeEvent) -> dict[str, Any]:
         """Handle subscription update (renewal, upgrade, etc.)."""
-        subscription = event.data
-        customer_id = subscription.get("customer", "")
-        status = subscription.get("status", "")
-        metadata = subscription.get("metadata", {})
-        device_id = metadata.get("device_id", "")
+        get = event.data.get
+        customer_id = get("customer", "")
+        status = get("status", "")
+        device_id = get("metadata", {}).get("device_id", "")
 
         if status == "active":
             return {
@@ -264,21 +418,15 @@ class StripeIntegration:
 
     def _handle_subscription_deleted(self, event: StripeEvent) -> dict[str, Any]:
         """Handle subscription cancellation."""
-        subscription = event.data
-        metadata = subscription.get("metadata", {})
-        device_id = metadata.get("device_id", "")
+        device_id = event.data.get("metadata", {}).get("device_id", "")
 
-        return {
-            "action": "downgrade_tier",
-            "device_id": device_id,
-            "tier": "free",
-        }
+        return {**_DOWNGRADE_FREE, "device_id": device_id}
 
     def _handle_payment_succeeded(self, event: StripeEvent) -> dict[str, Any]:
         """Handle successful invoice payment (subscription renewal)."""
-        invoice = event.data
-        customer_id = invoice.get("customer", "")
-        subscription_id = invoice.get("subscription", "")
+        get = event.data.get
+        customer_id = get("customer", "")
+        subscription_id = get("subscription", "")
 
         return {
             "action": "subscription_renewed",
@@ -288,8 +436,7 @@ class StripeIntegration:
 
     def _handle_payment_failed(self, event: StripeEvent) -> dict[str, Any]:
         """Handle failed invoice payment."""
-        invoice = event.data
-        customer_id = invoice.get("customer", "")
+        customer_id = event.data.get("customer", "")
 
         return {
             "action": "payment_failed",
@@ -298,12 +445,7 @@ class StripeIntegration:
 
     def _get_token_pack_amount(self, product_type: str) -> int:
         """Get token amount for a token pack product."""
-        token_packs = {
-            "token_pack_small": 500,
-            "token_pack_medium": 2000,
-            "token_pack_large": 5000,
-        }
-        return token_packs.get(product_type, 0)
+        return TOKEN_PACK_AMOUNTS.get(product_type, 0)
 
     def create_checkout_url(self, device_id: str, product_type: str = "prompt_pack") -> str:
         """Generate Stripe checkout URL.
@@ -318,27 +460,11 @@ class StripeIntegration:
         if not self._enabled:
             return f"{self.config.cancel_url}&error=stripe_not_configured"
 
-        # Determine price ID
-        if product_type == "beta_operator":
-            price_id = self.config.beta_operator_price_id
-            mode = "payment"
-        elif product_type == "prompt_pack":
-            price_id = self.config.prompt_pack_price_id
-            mode = "payment"
-        elif product_type == "early_access":
-            price_id = self.config.early_access_price_id
-            mode = "subscription"
-        else:
-            # Legacy token packs
-            price_id = self.config.token_pack_price_ids.get(
-                product_type.replace("token_pack_", ""), ""
-            )
-            mode = "payment"
-
+        price_id, _ = self._products.get(product_type, _UNKNOWN_PRODUCT)
         if not price_id:
             return f"{self.config.cancel_url}&error=invalid_product"
 
-        logger.info(f"Would create checkout session: device={device_id}, product={product_type}")
+        logger.info("Would create checkout session: device=%s, product=%s", device_id, product_type)
         return f"https://checkout.stripe.com/placeholder?device_id={device_id}&product={product_type}"
 
     async def create_checkout_session(self, device_id: str, product_type: str = "prompt_pack") -> CheckoutSession | None:
@@ -355,64 +481,66 @@ class StripeIntegration:
             logger.warning("Stripe not configured, cannot create checkout session")
             return None
 
+        if httpx is None:
+            logger.error("httpx not installed, cannot create checkout session")
+            return None
+
         try:
-            import httpx
+            price_id, mode = self._products.get(product_type, _UNKNOWN_PRODUCT)
+            if not price_id:
+                logger.error("No price ID configured for %s", product_type)
+                return None
 
-            # Determine price ID and mode
-            if product_type == "beta_operator":
-                price_id = self.config.beta_operator_price_id
-                mode = "payment"
-            elif product_type == "prompt_pack":
-                price_id = self.config.prompt_pack_price_id
-                mode = "payment"
-            elif product_type == "early_access":
-                price_id = self.config.early_access_price_id
-                mode = "subscription"
-            else:
-                # Legacy token packs
-                pack_size = product_type.replace("token_pack_", "")
-                price_id = self.config.token_pack_price_ids.get(pack_size, "")
-                mode = "payment"
+            client = await self._get_http_client()
+            response = await client.post(
+                "/checkout/sessions",
+                data=self._checkout_base | {
+                    "mode": mode,
+                    "line_items[0][price]": price_id,
+                    "client_reference_id": device_id,
+                    "metadata[device_id]": device_id,
+                    "metadata[product_type]": product_type,
+                },
+            )
 
-            if not price_id:
-                logger.error(f"No price ID configured for {product_type}")
+            if response.status_code != 200:
+                logger.error("Stripe API error: %s", response.text)
                 return None
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.STRIPE_API_BASE}/checkout/sessions",
-                    auth=(self.config.secret_key, ""),
-                    data={
-                        "mode": mode,
-                        "line_items[0][price]": price_id,
-                        "line_items[0][quantity]": "1",
-                        "success_url": self.config.success_url,
-                        "cancel_url": self.config.cancel_url,
-                        "client_reference_id": device_id,
-                        "metadata[device_id]": device_id,
-                        "metadata[product_type]": product_type,
-                    },
-                )
-
-                if response.status_code != 200:
-                    logger.error(f"Stripe API error: {response.text}")
-                    return None
-
-                session_data = response.json()
-                return CheckoutSession(
-                    id=session_data["id"],
-                    url=session_data["url"],
-                    device_id=device_id,
-                    product_type=product_type,
-                )
-
-        except ImportError:
-            logger.error("httpx not installed, cannot create checkout session")
-            return None
+            session_data = response.json()
+            return CheckoutSession(
+                id=session_data["id"],
+                url=session_data["url"],
+                device_id=device_id,
+                product_type=product_type,
+            )
+
         except Exception as e:
-            logger.error(f"Failed to create checkout session: {e}")
+            logger.error("Failed to create checkout session: %s", e)
             return None
 
+    async def _get_http_client(self) -> httpx.AsyncClient:
+        """Return the shared Stripe API client, creating it on first use.
+
+        Reusing one client keeps the connection to api.stripe.com pooled
+        instead of paying a TCP + TLS handshake per checkout.
+        """
+        if self._http_client is None:
+            async with self._http_client_lock:
+                if self._http_client is None:
+                    self._http_client = httpx.AsyncClient(
+                        base_url=self.STRIPE_API_BASE,
+                        timeout=STRIPE_API_TIMEOUT,
+                        auth=(self.config.secret_key, ""),
+                    )
+        return self._http_client
+
+    async def close(self) -> None:
+        """Close the shared HTTP client."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
     def get_customer_portal_url(self, customer_id: str) -> str:
         """Get Stripe customer portal URL for managing subscription.
 
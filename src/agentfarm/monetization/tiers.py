@@ -27,6 +27,8 @@ Architecture:
 """
 
 import logging
+import time
+from collections import Counter
 from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
@@ -47,6 +49,12 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# How long get_stats() results are reused before rescanning users (seconds)
+STATS_CACHE_TTL = 5.0
+
+# Minimum interval between sweeps of expired vault sessions (seconds)
+VAULT_SESSION_SWEEP_INTERVAL = 60.0
+
 
 class AccessLevel(str, Enum):
     """Access levels for features."""
@@ -56,7 +64,7 @@ class AccessLevel(str, Enum):
     EARLY_ACCESS = "early_access"  # Full access
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TierLimits:
     """Limits for each tier."""
 
@@ -67,21 +75,30 @@ class TierLimits:
 
     @classmethod
     def free(cls) -> "TierLimits":
-        return cls(
-            workflows_per_day=5,
-            max_context_chars=0,  # No context injection for free
-            can_upload_files=False,
-            priority_queue=False,
-        )
+        return _FREE_LIMITS
 
     @classmethod
     def early_access(cls) -> "TierLimits":
-        return cls(
-            workflows_per_day=-1,  # Unlimited
-            max_context_chars=50000,
-            can_upload_files=True,
-            priority_queue=True,
-        )
+        return _EARLY_ACCESS_LIMITS
+
+
+# Shared immutable limits, returned by TierLimits.free()/early_access()
+_FREE_LIMITS = TierLimits(
+    workflows_per_day=5,
+    max_context_chars=0,  # No context injection for free
+    can_upload_files=False,
+    priority_queue=False,
+)
+_EARLY_ACCESS_LIMITS = TierLimits(
+    workflows_per_day=-1,  # Unlimited
+    max_context_chars=50000,
+    can_upload_files=True,
+    priority_queue=True,
+)
+
+# Shared (access level, limits) results of TierManager.get_user_tier()
+_FREE_TIER = (AccessLevel.FREE, _FREE_LIMITS)
+_EARLY_ACCESS_TIER = (AccessLevel.EARLY_ACCESS, _EARLY_ACCESS_LIMITS)
 
 
 class TierManager:
@@ -96,6 +113,7 @@ class TierManager:
         storage_dir: Path | str,
         stripe_config: dict[str, str] | None = None,
         enable_vault: bool = True,
+        users: UserManager | None = None,
     ) -> None:
         """Initialize tier manager.
 
@@ -103,18 +121,24 @@ class TierManager:
             storage_dir: Directory for persistent storage (.agentfarm/)
             stripe_config: Optional Stripe configuration override
             enable_vault: Whether to enable SecureVault for Early Access
+            users: Existing UserManager for storage_dir. Pass it when one
+                already exists so both share the same profile cache.
         """
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(parents=True, exist_ok=True)
 
         # Initialize components
-        self.users = UserManager(self.storage_dir)
+        self.users = users or UserManager(self.storage_dir)
         self.affiliates = AffiliateManager(self.storage_dir)
         self.stripe = StripeIntegration()
 
         # Initialize SecureVault if available and enabled
         self.vault: SecureVault | None = None
         self._vault_sessions: dict[str, VaultSession] = {}  # device_id -> session
+        self._last_vault_sweep = 0.0
+
+        # (monotonic timestamp, result) of the last get_stats() call
+        self._stats_cache: tuple[float, dict[str, Any]] | None = None
 
         if enable_vault and VAULT_AVAILABLE:
             try:
@@ -132,7 +156,7 @@ class TierManager:
             "TierManager initialized (Stripe: %s, Vault: %s, Users: %d)",
             "enabled" if self.stripe.enabled else "disabled",
             "enabled" if self.vault else "disabled",
-            len(self.users.list_users()),
+            sum(1 for _ in self.users.iter_tier_values()),
         )
 
     def get_user_tier(self, device_id: str) -> tuple[AccessLevel, TierLimits]:
@@ -144,12 +168,20 @@ class TierManager:
         Returns:
             Tuple of (access_level, limits)
         """
+        return self._resolve_tier(self.users.get_or_create_user(device_id))
+
+    def _resolve(self, device_id: str) -> tuple[UserProfile, AccessLevel, TierLimits]:
+        """Load a user once and return it together with its tier."""
         user = self.users.get_or_create_user(device_id)
+        access, limits = self._resolve_tier(user)
+        return user, access, limits
 
-        if user.tier == SubscriptionTier.EARLY_ACCESS:
-            return AccessLevel.EARLY_ACCESS, TierLimits.early_access()
-        else:
-            return AccessLevel.FREE, TierLimits.free()
+    @staticmethod
+    def _resolve_tier(user: UserProfile) -> tuple[AccessLevel, TierLimits]:
+        """Map an already-loaded user profile to access level and limits."""
+        if user.tier is SubscriptionTier.EARLY_ACCESS:
+            return _EARLY_ACCESS_TIER
+        return _FREE_TIER
 
     def check_workflow_access(self, device_id: str) -> tuple[bool, str]:
         """Check if user can run a workflow.
@@ -166,7 +198,6 @@ class TierManager:
             return True, "early_access"
 
         # Check daily limit for free users
-        user = self.users.get_or_create_user(device_id)
         daily_workflows = self._count_daily_workflows(device_id)
 
         if limits.workflows_per_day > 0 and daily_workflows >= limits.workflows_per_day:
@@ -192,12 +223,11 @@ class TierManager:
         Returns:
             Company context string or None if not available/allowed
         """
-        access, limits = self.get_user_tier(device_id)
+        user, _, limits = self._resolve(device_id)
 
         if not limits.max_context_chars:
             return None  # Free tier can't use context
 
-        user = self.users.get_or_create_user(device_id)
         return user.company_context
 
     def set_company_context(self, device_id: str, context: str) -> tuple[bool, str]:
@@ -210,7 +240,7 @@ class TierManager:
         Returns:
             Tuple of (success, message)
         """
-        access, limits = self.get_user_tier(device_id)
+        _, limits = self.get_user_tier(device_id)
 
         if not limits.max_context_chars:
             return False, "Company context requires Early Access subscription"
@@ -246,6 +276,7 @@ class TierManager:
         """
         if product == "early_access":
             self.users.upgrade_tier(device_id, SubscriptionTier.EARLY_ACCESS)
+            self._stats_cache = None
             logger.info("User %s upgraded to Early Access", device_id[:8])
 
     # ===========================================
@@ -266,6 +297,15 @@ class TierManager:
         if not self.vault:
             return None
 
+        # Drop expired sessions of users who never came back. The vault's own
+        # cleanup loop tears down their containers.
+        now = time.monotonic()
+        if now - self._last_vault_sweep > VAULT_SESSION_SWEEP_INTERVAL:
+            self._vault_sessions = {
+                d: s for d, s in self._vault_sessions.items() if not s.is_expired
+            }
+            self._last_vault_sweep = now
+
         access, limits = self.get_user_tier(device_id)
         if access != AccessLevel.EARLY_ACCESS:
             logger.debug("Vault access denied for %s (tier: %s)", device_id[:8], access.value)
@@ -378,15 +418,20 @@ class TierManager:
             return False
 
     def get_stats(self) -> dict[str, Any]:
-        """Get tier statistics."""
-        users = self.users.list_users()
+        """Get tier statistics.
 
-        tier_counts = {
-            "free": 0,
-            "early_access": 0,
-        }
-        for user in users:
-            tier_counts[user.tier.value] = tier_counts.get(user.tier.value, 0) + 1
+        Results are cached for STATS_CACHE_TTL seconds so polling dashboards
+        don't rescan every user profile on each request. Each call returns
+        its own copy, so callers may modify the result.
+        """
+        now = time.monotonic()
+        if self._stats_cache and now - self._stats_cache[0] < STATS_CACHE_TTL:
+            return self._copy_stats(self._stats_cache[1])
+
+        tier_counts = Counter(self.users.iter_tier_values())
+        total_users = sum(tier_counts.values())
+        tier_counts.setdefault("free", 0)
+        tier_counts.setdefault("early_access", 0)
 
         affiliate_stats = self.affiliates.get_click_stats(days=30)
 
@@ -394,10 +439,21 @@ class TierManager:
         vault_stats = self.vault.get_stats() if self.vault else {"available": False}
         vault_stats["active_user_sessions"] = len(self._vault_sessions)
 
-        return {
-            "total_users": len(users),
-            "tier_distribution": tier_counts,
+        result = {
+            "total_users": total_users,
+            "tier_distribution": dict(tier_counts),
             "affiliate_clicks_30d": affiliate_stats.get("total_clicks", 0),
             "stripe_enabled": self.stripe.enabled,
             "vault": vault_stats,
         }
+        self._stats_cache = (now, result)
+        return self._copy_stats(result)
+
+    @staticmethod
+    def _copy_stats(stats: dict[str, Any]) -> dict[str, Any]:
+        """Copy a cached stats payload, including its nested dicts."""
+        return {
+            **stats,
+            "tier_distribution": dict(stats["tier_distribution"]),
+            "vault": dict(stats["vault"]),
+        }
@@ -2,14 +2,135 @@ from __future__ import annotations
 
 """User management with device fingerprint-based identification and token tracking."""
 
+import atexit
+import heapq
 import json
+import logging
+import mmap
+import os
 import time
 import uuid
+import weakref
+from collections import Counter, OrderedDict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO, NamedTuple
 
-from pydantic import BaseModel, Field
+# Optional: orjson is several times faster than json for both directions
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+logger = logging.getLogger(__name__)
+
+# Profiles kept in memory per UserManager
+USER_CACHE_SIZE = 10000
+
+# Seconds between writes of deferred last_active updates
+FLUSH_INTERVAL = 5.0
+
+# last_active is only bumped once it is this stale (seconds)
+LAST_ACTIVE_RESOLUTION = 60.0
+
+# Deferred updates that force a flush before FLUSH_INTERVAL has passed
+FLUSH_MAX_DIRTY = 1000
+
+# Transactions per log file; a full log is rotated out and the one before dropped
+MAX_TRANSACTIONS = 10000
+
+# Size at which a per-user transaction log is rotated (keeps 1-2x this per user)
+MAX_USER_TRANSACTION_BYTES = 256 * 1024
+
+# Profile scans of at least this many files read them on a thread pool
+PARALLEL_SCAN_MIN_FILES = 256
+SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Company contexts longer than this are kept in contexts/ instead of the profile
+INLINE_CONTEXT_MAX_CHARS = 1024
+
+
+def _iter_lines_reversed(path: Path) -> Iterator[bytes]:
+    """Yield the non-empty lines of a file from last to first.
+
+    The file is memory-mapped and scanned backwards for newlines, so
+    callers that only need the most recent lines never read the whole
+    file, and only the yielded lines are copied.
+    """
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = len(mm)
+            while end > 0:
+                start = mm.rfind(b"\n", 0, end) + 1
+                if start < end:
+                    yield mm[start:end]
+                end = start - 1
+
+
+def _iter_lines_reversed_many(paths: list[Path]) -> Iterator[bytes]:
+    """Yield the lines of several files from last to first, newest file first.
+
+    Missing files are skipped.
+    """
+    for path in paths:
+        try:
+            yield from _iter_lines_reversed(path)
+        except FileNotFoundError:
+            continue
+
+
+def _read_json_file(path: str) -> Any:
+    """Read and parse a JSON file, or None if it is missing or invalid."""
+    try:
+        with open(path, "rb") as f:
+            return _json_loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _count_lines(path: Path) -> int:
+    """Count the lines of a file, 0 if it does not exist."""
+    try:
+        with path.open("rb") as f:
+            return sum(1 for _ in f)
+    except FileNotFoundError:
+        return 0
+
+
+# str.translate table deleting every ASCII character not allowed in file names
+_UNSAFE_ASCII = {i: None for i in range(128) if not (chr(i).isalnum() or chr(i) in "-_")}
+
+
+@lru_cache(maxsize=USER_CACHE_SIZE)
+def _sanitize_device_id(device_id: str) -> str:
+    """Reduce a device_id to a safe file name stem."""
+    if device_id.isascii():
+        return device_id.translate(_UNSAFE_ASCII)[:64]
+    return "".join(c for c in device_id if c.isalnum() or c in "-_")[:64]
+
+
+def _user_bucket(safe_id: str) -> str:
+    """Subdirectory of users/ holding a profile, from its sanitized id."""
+    return safe_id[:2] or "_"
+
+
+def _flush_at_exit(ref: weakref.ReferenceType[UserManager]) -> None:
+    """atexit hook: flush and close a UserManager if it is still alive."""
+    manager = ref()
+    if manager is not None:
+        manager.close()
 
 
 class SubscriptionTier(str, Enum):
@@ -22,36 +143,75 @@ class SubscriptionTier(str, Enum):
     PRO = "pro"
 
 
-class UserProfile(BaseModel):
-    """User profile for prompt tracking and subscriptions."""
-
-    device_id: str = Field(..., description="Unique device fingerprint")
-    email: str | None = Field(default=None, description="Optional email for account linking")
-    tier: SubscriptionTier = Field(default=SubscriptionTier.FREE)
-    stripe_customer_id: str | None = Field(default=None)
-    tokens_remaining: int = Field(default=0, description="Legacy - use prompts_remaining")
-    tokens_used_total: int = Field(default=0, description="Lifetime token usage")
-    prompts_remaining: int = Field(default=0, description="Available prompts (workflows)")
-    prompts_used_total: int = Field(default=0, description="Lifetime prompt usage")
-    company_context: str | None = Field(default=None, description="Custom company instructions")
-    agent_custom_prompts: dict[str, str] = Field(
-        default_factory=dict,
-        description="Custom system prompt additions per agent: {agent_id: custom_text}"
-    )
-    is_admin: bool = Field(default=False, description="Admin has unlimited access")
-    created_at: float = Field(default_factory=time.time)
-    last_active: float = Field(default_factory=time.time)
-
-
-class TokenTransaction(BaseModel):
+@dataclass(slots=True)
+class UserProfile:
+    """User profile for prompt tracking and subscriptions.
+
+    A plain slotted dataclass: profiles are loaded and saved on nearly every
+    request and only ever hold data this module wrote itself.
+    """
+
+    device_id: str  # Unique device fingerprint
+    email: str | None = None  # Optional email for account linking
+    tier: SubscriptionTier = SubscriptionTier.FREE
+    stripe_customer_id: str | None = None
+    tokens_remaining: int = 0  # Legacy - use prompts_remaining
+    tokens_used_total: int = 0  # Lifetime token usage
+    prompts_remaining: int = 0  # Available prompts (workflows)
+    prompts_used_total: int = 0  # Lifetime prompt usage
+    company_context: str | None = None  # Custom company instructions
+    # Custom system prompt additions per agent: {agent_id: custom_text}
+    agent_custom_prompts: dict[str, str] = field(default_factory=dict)
+    is_admin: bool = False  # Admin has unlimited access
+    created_at: float = field(default_factory=time.time)
+    last_active: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> UserProfile:
+        """Build a profile from stored data, ignoring unknown keys."""
+        kwargs = {name: data[name] for name in _USER_FIELDS if name in data}
+        kwargs["tier"] = SubscriptionTier(kwargs.get("tier", SubscriptionTier.FREE))
+        return cls(**kwargs)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Convert to a JSON-serializable dict."""
+        data = {name: getattr(self, name) for name in _USER_FIELDS}
+        data["tier"] = self.tier.value
+        return data
+
+
+@dataclass(slots=True)
+class TokenTransaction:
     """Record of token usage or purchase."""
 
-    id: str = Field(default_factory=lambda: str(uuid.uuid4())[:8])
     user_device_id: str
-    amount: int = Field(..., description="Positive for purchases, negative for usage")
-    reason: str = Field(..., description="workflow_run, token_pack_small, subscription_refresh, etc.")
+    amount: int  # Positive for purchases, negative for usage
+    reason: str  # workflow_run, token_pack_small, subscription_refresh, etc.
     workflow_id: str | None = None
-    timestamp: float = Field(default_factory=time.time)
+    id: str = field(default_factory=lambda: str(uuid.uuid4())[:8])
+    timestamp: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> TokenTransaction:
+        """Build a transaction from stored data, ignoring unknown keys."""
+        return cls(**{name: data[name] for name in _TRANSACTION_FIELDS if name in data})
+
+    def to_dict(self) -> dict[str, Any]:
+        """Convert to a JSON-serializable dict."""
+        return {name: getattr(self, name) for name in _TRANSACTION_FIELDS}
+
+
+_USER_FIELDS = tuple(f.name for f in fields(UserProfile))
+_TRANSACTION_FIELDS = tuple(f.name for f in fields(TokenTransaction))
+
+
+class _UserSummary(NamedTuple):
+    """The few profile fields get_stats() aggregates over."""
+
+    tier: str
+    tokens_used_total: int
+    prompts_used_total: int
+    last_active: float
 
 
 class UserManager:
@@ -59,6 +219,14 @@ class UserManager:
 
     Uses device fingerprints for identification - no passwords required.
     Data is stored as JSON files in .agentfarm/users/
+
+    Profiles are cached in memory after the first read. Each cache hit
+    checks the profile file's inode and mtime, so changes written by another
+    UserManager on the same directory (e.g. scripts/set_admin.py while the
+    server runs) are picked up instead of being overwritten; the stats
+    index is rebuilt when users/.generation shows such a write. Balance and
+    tier changes are written immediately; last_active bumps and usage
+    counters of unlimited users are deferred and written by flush().
     """
 
     def __init__(self, storage_dir: Path | str) -> None:
@@ -72,51 +240,321 @@ class UserManager:
         self.tokens_dir.mkdir(parents=True, exist_ok=True)
         self.contexts_dir.mkdir(parents=True, exist_ok=True)
 
+        # Append-only transaction log, one JSON object per line
+        self.transactions_path = self.tokens_dir / "transactions.jsonl"
+        self.previous_transactions_path = self.tokens_dir / "transactions.1.jsonl"
+        self._tx_count: int | None = None  # Lines in the log, counted lazily
+        self._previous_tx_count: int | None = None
+        self._log_file: BinaryIO | None = None  # Append handle, opened lazily
+        self._migrate_legacy_transactions()
+
+        # The same transactions split per user, so per-user queries skip the
+        # global log
+        self.user_transactions_dir = self.tokens_dir / "by_user"
+        self._build_user_transaction_logs()
+
+        # Profiles live in users/<bucket>/<id>.json; buckets created so far
+        self._buckets: set[str] = set()
+        self._migrate_flat_user_files()
+
+        # Stats fields of every stored profile keyed by file stem, with running
+        # totals over them. Built by one scan on first use, then kept current
+        # by _write_user.
+        self._summaries: dict[str, _UserSummary] | None = None
+        # Every profile write bumps this file's mtime; a value other than the
+        # one the index last saw means another UserManager wrote profiles
+        self._generation_path = self.users_dir / ".generation"
+        self._generation_path.touch()
+        self._seen_generation: int | None = None
+        self._tier_totals: Counter[str] = Counter()
+        self._tokens_used_total = 0
+        self._prompts_used_total = 0
+
+        # LRU of loaded profiles, plus device_ids with unwritten changes
+        self._cache: OrderedDict[str, UserProfile] = OrderedDict()
+        self._dirty: set[str] = set()
+        # (inode, mtime_ns) of each cached profile's file as last read or written
+        self._file_stamps: dict[str, tuple[int, int]] = {}
+        self._last_flush = time.monotonic()
+
+        # device_ids whose contexts/ file matches the in-memory company_context
+        self._contexts_on_disk: set[str] = set()
+
+        # Write deferred updates on shutdown without keeping the manager alive
+        atexit.register(_flush_at_exit, weakref.ref(self))
+
+    def _migrate_legacy_transactions(self) -> None:
+        """Convert the old single-array transactions.json into the JSONL log."""
+        legacy_path = self.tokens_dir / "transactions.json"
+        if not legacy_path.exists() or self.transactions_path.exists():
+            return
+
+        try:
+            transactions = _json_loads(legacy_path.read_bytes())
+        except ValueError:
+            transactions = []
+
+        tmp_path = self.transactions_path.with_suffix(".jsonl.tmp")
+        with tmp_path.open("wb") as f:
+            for t in transactions[-MAX_TRANSACTIONS:]:
+                f.write(_json_dumps(t) + b"\n")
+        os.replace(tmp_path, self.transactions_path)
+        legacy_path.rename(legacy_path.with_suffix(".json.bak"))
+
+    def _build_user_transaction_logs(self) -> None:
+        """Split an existing global log into per-user logs on first start."""
+        if self.user_transactions_dir.exists():
+            return
+
+        tmp_dir = self.tokens_dir / "by_user.tmp"
+        tmp_dir.mkdir(exist_ok=True)
+        per_user: dict[str, list[bytes]] = {}
+        for path in (self.previous_transactions_path, self.transactions_path):
+            if not path.exists():
+                continue
+            with path.open("rb") as f:
+                for line in f:
+                    try:
+                        device_id = _json_loads(line)["user_device_id"]
+                    except (ValueError, TypeError, KeyError):
+                        continue
+                    per_user.setdefault(_sanitize_device_id(device_id), []).append(line)
+        for safe_id, lines in per_user.items():
+            (tmp_dir / f"{safe_id}.jsonl").write_bytes(b"".join(lines))
+        tmp_dir.rename(self.user_transactions_dir)
+
+    def _migrate_flat_user_files(self) -> None:
+        """Move profiles from the old flat users/ layout into bucket directories."""
+        with os.scandir(self.users_dir) as entries:
+            flat_files = [e.name for e in entries if e.is_file() and e.name.endswith(".json")]
+        for name in flat_files:
+            bucket_dir = self.users_dir / _user_bucket(name[: -len(".json")])
+            bucket_dir.mkdir(exist_ok=True)
+            os.replace(self.users_dir / name, bucket_dir / name)
+        if flat_files:
+            logger.info("Moved %d user profiles into bucket directories", len(flat_files))
+
     def _user_path(self, device_id: str) -> Path:
         """Get path to user profile file."""
-        # Sanitize device_id for filesystem
-        safe_id = "".join(c for c in device_id if c.isalnum() or c in "-_")[:64]
-        return self.users_dir / f"{safe_id}.json"
+        safe_id = _sanitize_device_id(device_id)
+        return self.users_dir / _user_bucket(safe_id) / f"{safe_id}.json"
+
+    def _context_path(self, device_id: str) -> Path:
+        """Get path to a user's out-of-line company context."""
+        return self.contexts_dir / f"{_sanitize_device_id(device_id)}.txt"
+
+    def _user_transactions_path(self, device_id: str) -> Path:
+        """Get path to a user's own transaction log."""
+        return self.user_transactions_dir / f"{_sanitize_device_id(device_id)}.jsonl"
+
+    def _previous_user_transactions_path(self, device_id: str) -> Path:
+        """Get path to a user's rotated-out transaction log."""
+        return self.user_transactions_dir / f"{_sanitize_device_id(device_id)}.1.jsonl"
+
+    def _get_cached(self, device_id: str) -> UserProfile | None:
+        """Return a user from the cache, loading it from disk on a miss."""
+        user = self._cache.get(device_id)
+        if user is not None:
+            if self._file_stamps.get(device_id) == self._file_stamp(device_id):
+                self._cache.move_to_end(device_id)
+                return user
+            return self._reload_changed(user)
 
-    def get_or_create_user(self, device_id: str) -> UserProfile:
-        """Get existing user or create new one with 1 free tryout workflow."""
+        user = self._load_user(device_id)
+        if user is not None:
+            self._remember(user)
+        return user
+
+    def _file_stamp(self, device_id: str) -> tuple[int, int] | None:
+        """(inode, mtime_ns) of a profile file, or None if it doesn't exist.
+
+        Profiles are replaced rather than rewritten in place, so every write
+        produces a new inode even where mtime resolution is coarse.
+        """
+        try:
+            st = os.stat(self._user_path(device_id))
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _load_user(self, device_id: str) -> UserProfile | None:
+        """Read a profile (and its out-of-line context) from disk."""
         user_path = self._user_path(device_id)
+        try:
+            with user_path.open("rb") as f:
+                st = os.fstat(f.fileno())
+                data = _json_loads(f.read())
+            user = UserProfile.from_dict(data)
+        except FileNotFoundError:
+            return None
+        except (ValueError, TypeError) as e:
+            logger.warning("Unreadable profile for user %s: %s", device_id[:8], e)
+            return None
+        self._file_stamps[device_id] = (st.st_ino, st.st_mtime_ns)
 
-        if user_path.exists():
+        if data.get("company_context_file") and self._load_context(user):
+            self._contexts_on_disk.add(device_id)
+        return user
+
+    def _load_context(self, user: UserProfile) -> bool:
+        """Fill in a company context stored out of line in contexts/."""
+        try:
+            user.company_context = self._context_path(user.device_id).read_text()
+        except OSError as e:
+            logger.warning("Missing company context for user %s: %s", user.device_id[:8], e)
+            return False
+        return True
+
+    def _reload_changed(self, cached: UserProfile) -> UserProfile | None:
+        """Replace a cached profile whose file was changed by another process.
+
+        The file wins, except that deferred, monotonic fields (last_active
+        and usage counters) keep the larger of the two values.
+        """
+        device_id = cached.device_id
+        del self._cache[device_id]
+        self._file_stamps.pop(device_id, None)
+        self._contexts_on_disk.discard(device_id)
+        was_dirty = device_id in self._dirty
+        self._dirty.discard(device_id)
+
+        user = self._load_user(device_id)
+        if user is None:
+            return None
+        logger.info("Profile of user %s changed on disk, reloaded", device_id[:8])
+        if was_dirty:
+            user.last_active = max(user.last_active, cached.last_active)
+            user.tokens_used_total = max(user.tokens_used_total, cached.tokens_used_total)
+            user.prompts_used_total = max(user.prompts_used_total, cached.prompts_used_total)
+            self._dirty.add(device_id)
+        self._remember(user)
+        return user
+
+    def _remember(self, user: UserProfile) -> None:
+        """Put a user in the cache, evicting the least recently used one."""
+        self._cache[user.device_id] = user
+        self._cache.move_to_end(user.device_id)
+        if len(self._cache) > USER_CACHE_SIZE:
+            evicted_id, evicted = self._cache.popitem(last=False)
+            if evicted_id in self._dirty:
+                self._dirty.discard(evicted_id)
+                self._write_user(evicted)
+            self._file_stamps.pop(evicted_id, None)
+
+    def flush(self) -> None:
+        """Write all deferred profile updates to disk."""
+        for device_id in list(self._dirty):
+            user = self._cache.get(device_id)
+            if user is None:
+                self._dirty.discard(device_id)
+                continue
+            if self._file_stamps.get(device_id) != self._file_stamp(device_id):
+                # Changed by another process: merge instead of overwriting it
+                user = self._reload_changed(user)
+                if user is None:
+                    continue
             try:
-                data = json.loads(user_path.read_text())
-                user = UserProfile(**data)
-                # Update last_active
-                user.last_active = time.time()
-                self._save_user(user)
-                return user
-            except (json.JSONDecodeError, ValueError):
-                pass
+                self._write_user(user)
+            except OSError as e:
+                # Stays dirty, so the next flush retries it
+                logger.warning("Failed to flush user %s: %s", device_id[:8], e)
+                continue
+            self._dirty.discard(device_id)
+        self._last_flush = time.monotonic()
+
+    def _maybe_flush(self) -> None:
+        """Flush deferred updates if FLUSH_INTERVAL has passed or too many are pending."""
+        if not self._dirty:
+            return
+        overdue = time.monotonic() - self._last_flush >= FLUSH_INTERVAL
+        if overdue or len(self._dirty) >= FLUSH_MAX_DIRTY:
+            self.flush()
+
+    def get_or_create_user(self, device_id: str, now: float | None = None) -> UserProfile:
+        """Get existing user or create new one with 1 free tryout workflow.
+
+        Args:
+            device_id: User's device fingerprint
+            now: Current time, for callers that already read the clock
+        """
+        if now is None:
+            now = time.time()
+
+        user = self._get_cached(device_id)
+        if user is not None:
+            # Update last_active (written on the next flush), at a coarse
+            # resolution so bursts of requests don't keep dirtying the profile
+            if now - user.last_active >= LAST_ACTIVE_RESOLUTION:
+                user.last_active = now
+                self._defer_save(user)
+            return user
 
         # Create new user with 1 FREE tryout workflow (no guest mode)
         user = UserProfile(
             device_id=device_id,
             tier=SubscriptionTier.TRYOUT,
             prompts_remaining=1,  # 1 free workflow to try
+            created_at=now,
+            last_active=now,
         )
         self._save_user(user)
         return user
 
     def _save_user(self, user: UserProfile) -> None:
-        """Save user profile to disk."""
+        """Save user profile to disk and cache."""
+        self._write_user(user)
+        self._dirty.discard(user.device_id)
+        self._remember(user)
+
+    def _defer_save(self, user: UserProfile) -> None:
+        """Mark a cached user for the next flush instead of writing it now.
+
+        Only for fields that don't affect balances or access (last_active,
+        usage counters of unlimited users).
+        """
+        self._dirty.add(user.device_id)
+        self._maybe_flush()
+
+    def _write_user(self, user: UserProfile) -> None:
+        """Write a user profile file."""
         user_path = self._user_path(user.device_id)
-        user_path.write_text(user.model_dump_json(indent=2))
+        bucket = user_path.parent.name
+        if bucket not in self._buckets:
+            user_path.parent.mkdir(exist_ok=True)
+            self._buckets.add(bucket)
+        # Write a temp file and rename it over the profile, so a crash
+        # mid-write never leaves a truncated profile behind
+        data = user.to_dict()
+        context = user.company_context
+        if context and len(context) > INLINE_CONTEXT_MAX_CHARS:
+            # Large contexts live in their own file, written only when they change
+            if user.device_id not in self._contexts_on_disk:
+                self._context_path(user.device_id).write_text(context)
+                self._contexts_on_disk.add(user.device_id)
+            data["company_context"] = None
+            data["company_context_file"] = True
+
+        tmp_path = user_path.with_suffix(".json.tmp")
+        tmp_path.write_bytes(_json_dumps(data))
+        os.replace(tmp_path, user_path)
+        st = os.stat(user_path)
+        self._file_stamps[user.device_id] = (st.st_ino, st.st_mtime_ns)
+
+        self._bump_generation()
+        if self._summaries is not None:
+            self._index_summary(
+                user_path.stem,
+                _UserSummary(
+                    user.tier.value,
+                    user.tokens_used_total,
+                    user.prompts_used_total,
+                    user.last_active,
+                ),
+            )
 
     def get_user(self, device_id: str) -> UserProfile | None:
         """Get user by device ID, returns None if not found."""
-        user_path = self._user_path(device_id)
-        if not user_path.exists():
-            return None
-        try:
-            data = json.loads(user_path.read_text())
-            return UserProfile(**data)
-        except (json.JSONDecodeError, ValueError):
-            return None
+        return self._get_cached(device_id)
 
     def update_tokens(self, device_id: str, amount: int, reason: str, workflow_id: str | None = None) -> int:
         """Add/subtract tokens, return new balance.
@@ -133,10 +571,10 @@ class UserManager:
         user = self.get_or_create_user(device_id)
 
         # For Early Access tier, tokens are unlimited
-        if user.tier == SubscriptionTier.EARLY_ACCESS and amount < 0:
+        if user.tier is SubscriptionTier.EARLY_ACCESS and amount < 0:
             # Still track usage but don't deduct
             user.tokens_used_total += abs(amount)
-            self._save_user(user)
+            self._defer_save(user)
             self._log_transaction(device_id, amount, reason, workflow_id)
             return user.tokens_remaining  # Return unchanged balance
 
@@ -158,7 +596,7 @@ class UserManager:
         Early Access users always have enough tokens.
         """
         user = self.get_or_create_user(device_id)
-        if user.tier == SubscriptionTier.EARLY_ACCESS:
+        if user.tier is SubscriptionTier.EARLY_ACCESS:
             return True
         return user.tokens_remaining >= required
 
@@ -190,53 +628,99 @@ class UserManager:
             workflow_id=workflow_id,
         )
 
-        # Append to transactions log
-        log_path = self.tokens_dir / "transactions.json"
-        transactions: list[dict[str, Any]] = []
-
-        if log_path.exists():
-            try:
-                transactions = json.loads(log_path.read_text())
-            except json.JSONDecodeError:
-                transactions = []
-
-        transactions.append(transaction.model_dump())
-
-        # Keep last 10000 transactions
-        if len(transactions) > 10000:
-            transactions = transactions[-10000:]
-
-        log_path.write_text(json.dumps(transactions, indent=2))
+        # Append a single line instead of rewriting the whole log
+        line = _json_dumps(transaction.to_dict()) + b"\n"
+        tx_count = self._count_transactions()
+        if self._log_file is None:
+            self._log_file = self.transactions_path.open("ab")
+        # Flush every line: transactions are balance records and must not
+        # sit in a user-space buffer if the process dies
+        self._log_file.write(line)
+        self._log_file.flush()
+        self._tx_count = tx_count + 1
+        user_log = self._user_transactions_path(device_id)
+        with user_log.open("ab") as f:
+            f.write(line)
+            user_log_size = f.tell()
+        if user_log_size >= MAX_USER_TRANSACTION_BYTES:
+            # Same scheme as the global log: keep one rotated-out file
+            os.replace(user_log, self._previous_user_transactions_path(device_id))
+
+        if self._tx_count >= MAX_TRANSACTIONS:
+            self._rotate_transactions()
+
+    def _count_transactions(self) -> int:
+        """Number of lines in the current log, counted once then tracked."""
+        if self._tx_count is None:
+            self._tx_count = _count_lines(self.transactions_path)
+        return self._tx_count
+
+    def _count_previous_transactions(self) -> int:
+        """Number of lines in the rotated-out log."""
+        if self._previous_tx_count is None:
+            self._previous_tx_count = _count_lines(self.previous_transactions_path)
+        return self._previous_tx_count
+
+    def _rotate_transactions(self) -> None:
+        """Replace the previous log with the full current one and start afresh.
+
+        Between MAX_TRANSACTIONS and twice that many transactions are kept,
+        and no line is ever rewritten.
+        """
+        self._close_log_file()  # Reopened on the next write, on a new file
+        os.replace(self.transactions_path, self.previous_transactions_path)
+        self._previous_tx_count = self._tx_count
+        self._tx_count = 0
+
+    def _close_log_file(self) -> None:
+        """Close the transaction log append handle, if open."""
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def close(self) -> None:
+        """Flush deferred profile updates and release open files."""
+        self.flush()
+        self._close_log_file()
 
     def get_transactions(self, device_id: str | None = None, limit: int = 100) -> list[TokenTransaction]:
-        """Get recent transactions, optionally filtered by device_id."""
-        log_path = self.tokens_dir / "transactions.json"
-        if not log_path.exists():
-            return []
+        """Get recent transactions, optionally filtered by device_id.
 
-        try:
-            data = json.loads(log_path.read_text())
-            transactions = [TokenTransaction(**t) for t in data]
-        except (json.JSONDecodeError, ValueError):
+        The log is read backwards and parsing stops once ``limit`` matching
+        transactions have been found. With a device_id only that user's own
+        logs are read.
+        """
+        if limit <= 0:
             return []
-
         if device_id:
-            transactions = [t for t in transactions if t.user_device_id == device_id]
+            paths = [
+                self._user_transactions_path(device_id),
+                self._previous_user_transactions_path(device_id),
+            ]
+        else:
+            paths = [self.transactions_path, self.previous_transactions_path]
 
         # Return most recent first
-        transactions.reverse()
-        return transactions[:limit]
+        transactions: list[TokenTransaction] = []
+        for line in _iter_lines_reversed_many(paths):
+            try:
+                transaction = TokenTransaction.from_dict(_json_loads(line))
+            except (ValueError, TypeError):
+                continue
+            if device_id and transaction.user_device_id != device_id:
+                continue
+            transactions.append(transaction)
+            if len(transactions) >= limit:
+                break
+        return transactions
 
     def set_company_context(self, device_id: str, context: str) -> None:
         """Save company context/instructions for a user."""
         user = self.get_or_create_user(device_id)
         user.company_context = context
+        self._contexts_on_disk.discard(device_id)
         self._save_user(user)
 
-        # Also save to contexts directory for backup
-        context_path = self.contexts_dir / f"{user.device_id[:16]}.txt"
-        context_path.write_text(context)
-
     def get_company_context(self, device_id: str) -> str | None:
         """Get company context for a user."""
         user = self.get_user(device_id)
@@ -258,36 +742,144 @@ class UserManager:
 
     def list_users(self, limit: int = 100) -> list[UserProfile]:
         """List all users (admin function)."""
+        self.flush()  # Fold deferred last_active updates into the index
+        summaries = self._ensure_summaries()
+
+        # Pick the most recently active from the index, then open only those
+        newest = heapq.nlargest(limit, summaries.items(), key=lambda item: item[1].last_active)
         users: list[UserProfile] = []
-        for user_file in self.users_dir.glob("*.json"):
+        for key, _ in newest:
+            data = _read_json_file(os.path.join(self.users_dir, _user_bucket(key), f"{key}.json"))
+            if data is None:
+                continue
             try:
-                data = json.loads(user_file.read_text())
-                users.append(UserProfile(**data))
-            except (json.JSONDecodeError, ValueError):
+                user = UserProfile.from_dict(data)
+            except (ValueError, TypeError):
                 continue
+            if data.get("company_context_file"):
+                self._load_context(user)
+            users.append(user)
+        return users
+
+    def _iter_user_files(self) -> Iterator[str]:
+        """Yield the path of every stored profile, bucket by bucket."""
+        with os.scandir(self.users_dir) as buckets:
+            bucket_paths = [b.path for b in buckets if b.is_dir()]
+        for bucket_path in bucket_paths:
+            with os.scandir(bucket_path) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".json"):
+                        yield entry.path
+
+    def _read_user_files(self) -> Iterator[tuple[str, Any]]:
+        """Yield (path, parsed JSON) of every readable stored profile.
+
+        Large directories are read by a thread pool, since a cold scan is
+        bound by file open/read latency rather than CPU.
+        """
+        paths = list(self._iter_user_files())
+        if len(paths) < PARALLEL_SCAN_MIN_FILES:
+            results = map(_read_json_file, paths)
+            yield from ((p, d) for p, d in zip(paths, results, strict=True) if d is not None)
+            return
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+            for path, data in zip(paths, pool.map(_read_json_file, paths), strict=True):
+                if data is not None:
+                    yield path, data
+
+    def _iter_user_summaries(self) -> Iterator[tuple[str, _UserSummary]]:
+        """Yield (file stem, stats fields) of every stored profile in a single pass."""
+        for user_file, data in self._read_user_files():
+            try:
+                summary = _UserSummary(
+                    data.get("tier", SubscriptionTier.FREE.value),
+                    data.get("tokens_used_total", 0),
+                    data.get("prompts_used_total", 0),
+                    data.get("last_active", 0.0),
+                )
+            except AttributeError:
+                continue
+            yield os.path.basename(user_file)[: -len(".json")], summary
+
+    def preload(self) -> int:
+        """Read every stored profile once, ahead of the first admin query.
 
-        # Sort by last_active, most recent first
-        users.sort(key=lambda u: u.last_active, reverse=True)
-        return users[:limit]
+        Builds the stats index (reading files on a thread pool for large
+        installs), which also pulls the profiles into the OS page cache.
+
+        Returns:
+            Number of stored profiles
+        """
+        return len(self._ensure_summaries())
+
+    def _ensure_summaries(self) -> dict[str, _UserSummary]:
+        """Build the stats index with one scan of users/ if missing or stale."""
+        generation = self._current_generation()
+        if self._summaries is not None and generation != self._seen_generation:
+            logger.info("User profiles changed by another process, rebuilding stats index")
+            self._summaries = None
+        if self._summaries is None:
+            self._summaries = {}
+            self._tier_totals = Counter()
+            self._tokens_used_total = 0
+            self._prompts_used_total = 0
+            self._seen_generation = generation
+            for key, summary in self._iter_user_summaries():
+                self._index_summary(key, summary)
+        return self._summaries
+
+    def _current_generation(self) -> int:
+        """mtime_ns of the shared generation file (0 if it was removed)."""
+        try:
+            return os.stat(self._generation_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _bump_generation(self) -> None:
+        """Record a profile write in the shared generation file."""
+        if self._summaries is not None and self._current_generation() != self._seen_generation:
+            self._summaries = None  # Also written elsewhere; rescan on next use
+        stamp = time.time_ns()
+        try:
+            os.utime(self._generation_path, ns=(stamp, stamp))
+        except FileNotFoundError:
+            self._generation_path.touch()
+        # Read back rather than trust stamp: filesystems round mtimes
+        self._seen_generation = self._current_generation()
+
+    def _index_summary(self, key: str, summary: _UserSummary) -> None:
+        """Store a profile's stats fields and adjust the running totals."""
+        old = self._summaries.get(key)
+        if old is not None:
+            self._tier_totals[old.tier] -= 1
+            self._tokens_used_total -= old.tokens_used_total
+            self._prompts_used_total -= old.prompts_used_total
+        self._summaries[key] = summary
+        self._tier_totals[summary.tier] += 1
+        self._tokens_used_total += summary.tokens_used_total
+        self._prompts_used_total += summary.prompts_used_total
+
+    def iter_tier_values(self) -> Iterator[str]:
+        """Yield the tier value of every stored profile without loading them."""
+        for summary in self._ensure_summaries().values():
+            yield summary.tier
 
     def get_stats(self) -> dict[str, Any]:
         """Get usage statistics (admin function)."""
-        users = self.list_users(limit=10000)
-        transactions = self.get_transactions(limit=10000)
+        self.flush()  # Fold deferred last_active updates into the index
+        summaries = self._ensure_summaries()
+        active_since = time.time() - 86400
 
-        total_tokens_used = sum(u.tokens_used_total for u in users)
-        total_prompts_used = sum(u.prompts_used_total for u in users)
-        tier_counts = {tier.value: 0 for tier in SubscriptionTier}
-        for user in users:
-            tier_counts[user.tier.value] += 1
+        tier_counts = {tier.value: self._tier_totals[tier.value] for tier in SubscriptionTier}
+        active_last_24h = sum(1 for s in summaries.values() if s.last_active > active_since)
 
         return {
-            "total_users": len(users),
+            "total_users": len(summaries),
             "tier_counts": tier_counts,
-            "total_tokens_used": total_tokens_used,
-            "total_prompts_used": total_prompts_used,
-            "transactions_count": len(transactions),
-            "active_last_24h": sum(1 for u in users if time.time() - u.last_active < 86400),
+            "total_tokens_used": self._tokens_used_total,
+            "total_prompts_used": self._prompts_used_total,
+            "transactions_count": self._count_transactions() + self._count_previous_transactions(),
+            "active_last_24h": active_last_24h,
         }
 
     # =========================================================================
@@ -307,7 +899,7 @@ class UserManager:
             return True, "admin"
 
         # Early Access tier has unlimited prompts
-        if user.tier == SubscriptionTier.EARLY_ACCESS:
+        if user.tier is SubscriptionTier.EARLY_ACCESS:
             return True, "early_access"
 
         # Check prompt balance
@@ -326,13 +918,13 @@ class UserManager:
         # Admins don't consume prompts
         if user.is_admin:
             user.prompts_used_total += 1
-            self._save_user(user)
+            self._defer_save(user)
             return True, -1  # -1 indicates unlimited
 
         # Early Access doesn't consume prompts
-        if user.tier == SubscriptionTier.EARLY_ACCESS:
+        if user.tier is SubscriptionTier.EARLY_ACCESS:
             user.prompts_used_total += 1
-            self._save_user(user)
+            self._defer_save(user)
             return True, -1
 
         # Check and deduct prompt
@@ -357,7 +949,7 @@ class UserManager:
     def get_prompts_remaining(self, device_id: str) -> int:
         """Get user's remaining prompts. Returns -1 for unlimited (admin/early_access)."""
         user = self.get_or_create_user(device_id)
-        if user.is_admin or user.tier == SubscriptionTier.EARLY_ACCESS:
+        if user.is_admin or user.tier is SubscriptionTier.EARLY_ACCESS:
             return -1
         return user.prompts_remaining
 
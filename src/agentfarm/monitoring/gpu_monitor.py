@@ -2,7 +2,7 @@
 
 Supports:
 - AMD GPUs via rocm-smi
-- NVIDIA GPUs via nvidia-smi
+- NVIDIA GPUs via NVML (pynvml) when installed, else nvidia-smi
 - Automatic detection of available tools
 
 Provides:
@@ -15,18 +15,48 @@ Provides:
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
 import re
 import shutil
 import subprocess
-from dataclasses import dataclass, field
+import time
+from dataclasses import dataclass, field, replace
 from datetime import datetime
 from typing import Any
 
+# Optional: orjson parses bytes directly and is several times faster than json
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Optional: NVML bindings read NVIDIA sensors in-process instead of forking nvidia-smi
+try:
+    import pynvml
+except ImportError:
+    pynvml = None  # type: ignore
+
 logger = logging.getLogger(__name__)
 
+# All rocm-smi readings we use, matched in one pass over its output
+_ROCM_STATS_RE = re.compile(
+    r"Temperature \(Sensor (?P<sensor>edge|junction|memory)\).*?:\s*(?P<temp>[\d.]+)"
+    r"|Average Graphics Package Power.*?:\s*(?P<power>[\d.]+)"
+    r"|GPU use \(%\):\s*(?P<use>\d+)"
+    r"|VRAM Total (?P<vram>Memory|Used Memory) \(B\):\s*(?P<vram_bytes>\d+)"
+)
+
+# Readings younger than this are shared between callers instead of
+# re-running the smi tool (seconds)
+STATS_CACHE_TTL = 0.5
 
-@dataclass
+# Product name line of `rocm-smi --showproductname`
+_CARD_SERIES_RE = re.compile(r"Card Series:\s*(.+)")
+
+
+@dataclass(slots=True)
 class GPUStats:
     """GPU statistics snapshot."""
 
@@ -102,6 +132,72 @@ class GPUStats:
         }
 
 
+def _parse_rocm_json(data: Any, stats: GPUStats) -> None:
+    """Fill stats from the card entry of `rocm-smi --json` output.
+
+    Values are strings keyed by the same labels as the text output.
+    Unparseable values ("N/A") are skipped.
+    """
+    card = data.get(f"card{stats.gpu_id}") if isinstance(data, dict) else None
+    if not isinstance(card, dict):
+        return
+
+    for key, value in card.items():
+        try:
+            if key.startswith("Temperature (Sensor edge)"):
+                stats.temp_edge = float(value)
+            elif key.startswith("Temperature (Sensor junction)"):
+                stats.temp_junction = float(value)
+            elif key.startswith("Temperature (Sensor memory)"):
+                stats.temp_memory = float(value)
+            elif "Graphics Package Power" in key:
+                stats.power_draw = float(value)
+            elif key == "GPU use (%)":
+                stats.gpu_util = float(value)
+            elif key == "VRAM Total Memory (B)":
+                stats.vram_total = int(value)
+            elif key == "VRAM Total Used Memory (B)":
+                stats.vram_used = int(value)
+        except (TypeError, ValueError):
+            continue
+
+
+def _parse_rocm_output(output: str, stats: GPUStats) -> None:
+    """Fill stats from rocm-smi text output.
+
+    Only the first reading of each kind is used, i.e. that of the first GPU
+    listed.
+    """
+    seen: set[str] = set()
+    for match in _ROCM_STATS_RE.finditer(output):
+        if match["temp"] is not None:
+            key = match["sensor"]
+        elif match["power"] is not None:
+            key = "power"
+        elif match["use"] is not None:
+            key = "use"
+        else:
+            key = match["vram"]
+        if key in seen:
+            continue
+        seen.add(key)
+
+        if key == "edge":
+            stats.temp_edge = float(match["temp"])
+        elif key == "junction":
+            stats.temp_junction = float(match["temp"])
+        elif key == "memory":
+            stats.temp_memory = float(match["temp"])
+        elif key == "power":
+            stats.power_draw = float(match["power"])
+        elif key == "use":
+            stats.gpu_util = float(match["use"])
+        elif key == "Memory":
+            stats.vram_total = int(match["vram_bytes"])
+        else:
+            stats.vram_used = int(match["vram_bytes"])
+
+
 class GPUMonitor:
     """Monitor GPU statistics using rocm-smi or nvidia-smi.
 
@@ -126,11 +222,36 @@ class GPUMonitor:
         self._nvidia_smi = shutil.which("nvidia-smi")
         self._vendor: str | None = None
         self._gpu_name: str | None = None
+        # Cleared when the installed rocm-smi turns out not to support --json
+        self._rocm_json = True
+        # gpu_id -> (monotonic timestamp, stats) of the latest reading
+        self._stats_cache: dict[int, tuple[float, GPUStats]] = {}
+        self._stats_lock = asyncio.Lock()
+
+        # In-process NVIDIA readings, with device handles cached per gpu_id
+        self._nvml = False
+        self._nvml_handles: dict[int, Any] = {}
+        if pynvml is not None:
+            try:
+                pynvml.nvmlInit()
+                self._nvml = True
+            except Exception as e:
+                logger.debug("NVML unavailable, using nvidia-smi: %s", e)
+
+    def close(self) -> None:
+        """Release NVML if this monitor initialised it."""
+        if self._nvml:
+            self._nvml = False
+            self._nvml_handles.clear()
+            try:
+                pynvml.nvmlShutdown()
+            except Exception as e:
+                logger.debug("NVML shutdown failed: %s", e)
 
     @property
     def is_available(self) -> bool:
         """Check if any GPU monitoring tool is available."""
-        return bool(self._rocm_smi or self._nvidia_smi)
+        return bool(self._rocm_smi or self._nvml or self._nvidia_smi)
 
     @property
     def vendor(self) -> str:
@@ -138,7 +259,7 @@ class GPUMonitor:
         if self._vendor is None:
             if self._rocm_smi:
                 self._vendor = "AMD"
-            elif self._nvidia_smi:
+            elif self._nvml or self._nvidia_smi:
                 self._vendor = "NVIDIA"
             else:
                 self._vendor = "UNKNOWN"
@@ -151,10 +272,28 @@ class GPUMonitor:
             gpu_id: GPU index (default 0)
 
         Returns:
-            GPUStats with current readings
+            GPUStats with current readings. Callers within STATS_CACHE_TTL
+            of each other share one reading, and concurrent callers wait
+            for the same smi run. Each caller gets its own copy.
         """
+        cached = self._stats_cache.get(gpu_id)
+        if cached and time.monotonic() - cached[0] < STATS_CACHE_TTL:
+            return replace(cached[1])
+
+        async with self._stats_lock:
+            # Another caller may have refreshed while we waited
+            cached = self._stats_cache.get(gpu_id)
+            if not cached or time.monotonic() - cached[0] >= STATS_CACHE_TTL:
+                cached = (time.monotonic(), await self._read_stats(gpu_id))
+                self._stats_cache[gpu_id] = cached
+            return replace(cached[1])
+
+    async def _read_stats(self, gpu_id: int) -> GPUStats:
+        """Take a fresh reading with whichever smi tool is installed."""
         if self._rocm_smi:
             return await self._get_rocm_stats(gpu_id)
+        elif self._nvml:
+            return self._get_nvml_stats(gpu_id)
         elif self._nvidia_smi:
             return await self._get_nvidia_stats(gpu_id)
         else:
@@ -176,7 +315,7 @@ class GPUMonitor:
                 output = stdout.decode()
 
                 # Parse: "GPU[0]		: Card Series:		AMD Radeon RX 7800 XT"
-                match = re.search(r"Card Series:\s*(.+)", output)
+                match = _CARD_SERIES_RE.search(output)
                 if match:
                     self._gpu_name = match.group(1).strip()
                 else:
@@ -189,6 +328,14 @@ class GPUMonitor:
                 logger.warning("Failed to get GPU name: %s", e)
                 self._gpu_name = "Unknown AMD GPU"
 
+        elif self._nvml:
+            try:
+                name = pynvml.nvmlDeviceGetName(pynvml.nvmlDeviceGetHandleByIndex(0))
+                self._gpu_name = name.decode() if isinstance(name, bytes) else name
+            except Exception as e:
+                logger.warning("Failed to get GPU name: %s", e)
+                self._gpu_name = "Unknown NVIDIA GPU"
+
         elif self._nvidia_smi:
             try:
                 result = await asyncio.create_subprocess_exec(
@@ -209,57 +356,81 @@ class GPUMonitor:
     async def _get_rocm_stats(self, gpu_id: int) -> GPUStats:
         """Get stats using rocm-smi."""
         stats = GPUStats(gpu_id=gpu_id, vendor="AMD")
+        args = ["--showtemp", "--showuse", "--showmeminfo", "vram", "--showpower"]
 
         try:
-            result = await asyncio.create_subprocess_exec(
-                self._rocm_smi,
-                "--showtemp",
-                "--showuse",
-                "--showmeminfo", "vram",
-                "--showpower",
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-            stdout, _ = await result.communicate()
-            output = stdout.decode()
-
-            # Parse temperatures
-            edge_match = re.search(r"Temperature \(Sensor edge\).*?:\s*([\d.]+)", output)
-            if edge_match:
-                stats.temp_edge = float(edge_match.group(1))
+            if self._rocm_json:
+                try:
+                    stdout = await self._run_rocm_smi(*args, "--json")
+                    _parse_rocm_json(_json_loads(stdout), stats)
+                except subprocess.CalledProcessError as e:
+                    logger.info(
+                        "rocm-smi --json exited %d (%s), falling back to text parsing",
+                        e.returncode,
+                        e.stderr.decode(errors="replace").strip(),
+                    )
+                    self._rocm_json = False
+                except ValueError:
+                    if stdout.strip():  # Empty output is a failed read, not a format problem
+                        logger.info("rocm-smi has no JSON output, falling back to text parsing")
+                        self._rocm_json = False
+
+            if not self._rocm_json:
+                stdout = await self._run_rocm_smi(*args)
+                _parse_rocm_output(stdout.decode(), stats)
 
-            junction_match = re.search(r"Temperature \(Sensor junction\).*?:\s*([\d.]+)", output)
-            if junction_match:
-                stats.temp_junction = float(junction_match.group(1))
+            # Get GPU name
+            stats.name = await self.get_gpu_name()
 
-            memory_match = re.search(r"Temperature \(Sensor memory\).*?:\s*([\d.]+)", output)
-            if memory_match:
-                stats.temp_memory = float(memory_match.group(1))
+        except Exception as e:
+            logger.error("Failed to get ROCm stats: %s", e)
 
-            # Parse power
-            power_match = re.search(r"Average Graphics Package Power.*?:\s*([\d.]+)", output)
-            if power_match:
-                stats.power_draw = float(power_match.group(1))
+        return stats
 
-            # Parse GPU utilization
-            use_match = re.search(r"GPU use \(%\):\s*(\d+)", output)
-            if use_match:
-                stats.gpu_util = float(use_match.group(1))
+    async def _run_rocm_smi(self, *args: str) -> bytes:
+        """Run rocm-smi with the given arguments and return its stdout.
 
-            # Parse VRAM
-            vram_total_match = re.search(r"VRAM Total Memory \(B\):\s*(\d+)", output)
-            if vram_total_match:
-                stats.vram_total = int(vram_total_match.group(1))
+        Raises:
+            subprocess.CalledProcessError: If rocm-smi exits non-zero
+        """
+        result = await asyncio.create_subprocess_exec(
+            self._rocm_smi,
+            *args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        stdout, stderr = await result.communicate()
+        if result.returncode:
+            raise subprocess.CalledProcessError(
+                result.returncode, [self._rocm_smi, *args], stdout, stderr
+            )
+        return stdout
 
-            vram_used_match = re.search(r"VRAM Total Used Memory \(B\):\s*(\d+)", output)
-            if vram_used_match:
-                stats.vram_used = int(vram_used_match.group(1))
+    def _get_nvml_stats(self, gpu_id: int) -> GPUStats:
+        """Get stats through NVML, without spawning a process."""
+        stats = GPUStats(gpu_id=gpu_id, vendor="NVIDIA")
 
-            # Get GPU name
-            stats.name = await self.get_gpu_name()
+        try:
+            handle = self._nvml_handles.get(gpu_id)
+            if handle is None:
+                handle = self._nvml_handles[gpu_id] = pynvml.nvmlDeviceGetHandleByIndex(gpu_id)
+
+            name = pynvml.nvmlDeviceGetName(handle)
+            stats.name = name.decode() if isinstance(name, bytes) else name
+            stats.temp_junction = float(
+                pynvml.nvmlDeviceGetTemperature(handle, pynvml.NVML_TEMPERATURE_GPU)
+            )
+            memory = pynvml.nvmlDeviceGetMemoryInfo(handle)
+            stats.vram_used = int(memory.used)
+            stats.vram_total = int(memory.total)
+            utilization = pynvml.nvmlDeviceGetUtilizationRates(handle)
+            stats.gpu_util = float(utilization.gpu)
+            stats.memory_util = float(utilization.memory)
+            # Not every board reports power; read it last
+            stats.power_draw = pynvml.nvmlDeviceGetPowerUsage(handle) / 1000  # mW -> W
 
         except Exception as e:
-            logger.error("Failed to get ROCm stats: %s", e)
+            logger.error("Failed to get NVML stats: %s", e)
 
         return stats
 
@@ -317,6 +488,8 @@ class GPUMonitor:
         return {
             "available": self.is_available,
             "vendor": self.vendor,
-            "tool": str(self._rocm_smi or self._nvidia_smi or "none"),
+            "tool": str(
+                self._rocm_smi or ("nvml" if self._nvml else None) or self._nvidia_smi or "none"
+            ),
             "gpu": stats.to_dict(),
         }
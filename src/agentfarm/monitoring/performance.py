@@ -11,15 +11,16 @@ Integrates with LLMRouter events for automatic tracking.
 
 from __future__ import annotations
 
-import statistics
+import bisect
 import time
 from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+from itertools import islice
 from typing import Any
 
 
-@dataclass
+@dataclass(slots=True)
 class LLMMetrics:
     """Metrics for a single LLM request."""
 
@@ -27,9 +28,11 @@ class LLMMetrics:
     agent: str | None = None
     task_type: str | None = None
 
-    # Timing
+    # Timing: wall-clock timestamps for trends, monotonic ns for latency
     start_time: float = 0.0
     end_time: float = 0.0
+    start_ns: int = 0
+    latency_ns: int = 0
     latency_ms: float = 0.0
 
     # Tokens
@@ -44,12 +47,13 @@ class LLMMetrics:
 
     def finalize(self) -> None:
         """Calculate derived metrics after request completes."""
+        self.latency_ns = time.perf_counter_ns() - self.start_ns
         self.end_time = time.time()
-        self.latency_ms = (self.end_time - self.start_time) * 1000
+        self.latency_ms = self.latency_ns / 1_000_000
 
-        if self.latency_ms > 0:
+        if self.latency_ns > 0:
             # Output tokens per second (generation speed)
-            self.tokens_per_second = (self.output_tokens / self.latency_ms) * 1000
+            self.tokens_per_second = self.output_tokens * 1_000_000_000 / self.latency_ns
 
     def to_dict(self) -> dict[str, Any]:
         return {
@@ -65,9 +69,14 @@ class LLMMetrics:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class ModelStats:
-    """Aggregated statistics for a model."""
+    """Aggregated statistics for a model.
+
+    Latency and throughput samples are kept in bounded windows of
+    ``history_size`` entries. A sorted copy of the latency window is kept
+    alongside it with ``bisect``, so percentile lookups never sort.
+    """
 
     model: str
     total_requests: int = 0
@@ -77,8 +86,60 @@ class ModelStats:
     total_input_tokens: int = 0
     total_output_tokens: int = 0
 
-    latencies: list[float] = field(default_factory=list)
-    tokens_per_second: list[float] = field(default_factory=list)
+    history_size: int = 1000
+    latencies: deque[float] = field(init=False)
+    tokens_per_second: deque[float] = field(init=False)
+
+    # Running sums over the windows, adjusted as old samples fall out
+    _latency_sum: float = field(default=0.0, init=False, repr=False)
+    _tps_sum: float = field(default=0.0, init=False, repr=False)
+    _sorted_latencies: list[float] = field(default_factory=list, init=False, repr=False)
+    # to_dict() result, cleared by record()
+    _cached_dict: dict[str, Any] | None = field(default=None, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.latencies = deque(maxlen=self.history_size)
+        self.tokens_per_second = deque(maxlen=self.history_size)
+
+    def add(self, metrics: LLMMetrics) -> None:
+        """Fold a completed request into the counters and sample windows."""
+        self.total_requests += 1
+        if metrics.success:
+            self.successful_requests += 1
+        else:
+            self.failed_requests += 1
+        self.total_input_tokens += metrics.input_tokens
+        self.total_output_tokens += metrics.output_tokens
+        self.record(metrics.latency_ms, metrics.tokens_per_second)
+
+    def record(self, latency_ms: float, tokens_per_second: float) -> None:
+        """Add one latency (and, if positive, throughput) sample.
+
+        Drops the cached ``to_dict()`` result, so counters changed outside
+        add() should be followed by a record() call.
+        """
+        self._cached_dict = None
+        ordered = self._sorted_latencies
+        if len(self.latencies) == self.history_size:
+            evicted = self.latencies[0]
+            self._latency_sum -= evicted
+            del ordered[bisect.bisect_left(ordered, evicted)]
+        self.latencies.append(latency_ms)
+        self._latency_sum += latency_ms
+        bisect.insort(ordered, latency_ms)
+
+        if tokens_per_second > 0:
+            if len(self.tokens_per_second) == self.history_size:
+                self._tps_sum -= self.tokens_per_second[0]
+            self.tokens_per_second.append(tokens_per_second)
+            self._tps_sum += tokens_per_second
+
+    def _percentile(self, fraction: float) -> float:
+        """Nearest-rank percentile over the latency window."""
+        if len(self.latencies) < 2:
+            return self.avg_latency_ms
+        ordered = self._sorted_latencies
+        return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
 
     @property
     def success_rate(self) -> float:
@@ -90,37 +151,44 @@ class ModelStats:
     def avg_latency_ms(self) -> float:
         if not self.latencies:
             return 0.0
-        return statistics.mean(self.latencies)
+        return self._latency_sum / len(self.latencies)
 
     @property
     def p50_latency_ms(self) -> float:
         if not self.latencies:
             return 0.0
-        return statistics.median(self.latencies)
+        ordered = self._sorted_latencies
+        mid = len(ordered) // 2
+        if len(ordered) % 2:
+            return ordered[mid]
+        return (ordered[mid - 1] + ordered[mid]) / 2
 
     @property
     def p95_latency_ms(self) -> float:
-        if len(self.latencies) < 2:
-            return self.avg_latency_ms
-        sorted_latencies = sorted(self.latencies)
-        idx = int(len(sorted_latencies) * 0.95)
-        return sorted_latencies[min(idx, len(sorted_latencies) - 1)]
+        return self._percentile(0.95)
 
     @property
     def p99_latency_ms(self) -> float:
-        if len(self.latencies) < 2:
-            return self.avg_latency_ms
-        sorted_latencies = sorted(self.latencies)
-        idx = int(len(sorted_latencies) * 0.99)
-        return sorted_latencies[min(idx, len(sorted_latencies) - 1)]
+        return self._percentile(0.99)
 
     @property
     def avg_tokens_per_second(self) -> float:
         if not self.tokens_per_second:
             return 0.0
-        return statistics.mean(self.tokens_per_second)
+        return self._tps_sum / len(self.tokens_per_second)
 
     def to_dict(self) -> dict[str, Any]:
+        if self._cached_dict is None:
+            self._cached_dict = self._build_dict()
+        # Copy so callers can't alter the cached snapshot, nested dicts included
+        cached = self._cached_dict
+        return {
+            **cached,
+            "tokens": dict(cached["tokens"]),
+            "latency_ms": dict(cached["latency_ms"]),
+        }
+
+    def _build_dict(self) -> dict[str, Any]:
         return {
             "model": self.model,
             "total_requests": self.total_requests,
@@ -165,6 +233,8 @@ class PerformanceTracker:
 
     DEFAULT_HISTORY_SIZE = 1000
     DEFAULT_RETENTION_HOURS = 24
+    # Width of the time buckets behind get_windowed_stats()
+    TREND_BUCKET_SECONDS = 60
 
     def __init__(
         self,
@@ -183,6 +253,15 @@ class PerformanceTracker:
         # Recent metrics (rolling window)
         self._metrics: deque[LLMMetrics] = deque(maxlen=history_size)
 
+        # Running aggregates over successful requests in _metrics
+        self._window_successes = 0
+        self._window_latency_sum = 0.0
+        self._window_tps_sum = 0.0
+        self._window_tps_count = 0
+
+        # Latency trend over retention_hours: [bucket_start, count, sum, sum_sq]
+        self._trend: deque[list[float]] = deque()
+
         # Per-model statistics
         self._model_stats: dict[str, ModelStats] = {}
 
@@ -215,6 +294,7 @@ class PerformanceTracker:
             agent=agent,
             task_type=task_type,
             start_time=time.time(),
+            start_ns=time.perf_counter_ns(),
         )
 
         if request_id:
@@ -245,9 +325,24 @@ class PerformanceTracker:
         metrics.error = error
         metrics.finalize()
 
+        if len(self._metrics) == self.history_size:
+            self._add_to_window(self._metrics[0], -1)
         self._metrics.append(metrics)
+        self._add_to_window(metrics, 1)
+        if metrics.success:
+            self._record_trend(metrics)
         self._update_stats(metrics)
 
+    def _add_to_window(self, metrics: LLMMetrics, sign: int) -> None:
+        """Add (sign=1) or remove (sign=-1) a request from the window totals."""
+        if not metrics.success:
+            return
+        self._window_successes += sign
+        self._window_latency_sum += sign * metrics.latency_ms
+        if metrics.tokens_per_second > 0:
+            self._window_tps_sum += sign * metrics.tokens_per_second
+            self._window_tps_count += sign
+
     def complete_by_id(
         self,
         request_id: str,
@@ -271,69 +366,88 @@ class PerformanceTracker:
 
     def _update_stats(self, metrics: LLMMetrics) -> None:
         """Update aggregated statistics."""
-        # Update model stats
-        if metrics.model not in self._model_stats:
-            self._model_stats[metrics.model] = ModelStats(model=metrics.model)
-
-        model_stat = self._model_stats[metrics.model]
-        model_stat.total_requests += 1
-
-        if metrics.success:
-            model_stat.successful_requests += 1
+        self._stats_for(self._model_stats, metrics.model).add(metrics)
+        if metrics.agent:
+            self._stats_for(self._agent_stats, metrics.agent).add(metrics)
+
+    def _stats_for(self, table: dict[str, ModelStats], key: str) -> ModelStats:
+        """Get or create the ModelStats entry for key."""
+        stat = table.get(key)
+        if stat is None:
+            stat = table[key] = ModelStats(model=key, history_size=self.history_size)
+        return stat
+
+    def _record_trend(self, metrics: LLMMetrics) -> None:
+        """Fold a successful request into its time bucket and expire old ones."""
+        now = metrics.end_time
+        bucket_start = now - now % self.TREND_BUCKET_SECONDS
+        latency = metrics.latency_ms
+        if self._trend and self._trend[-1][0] == bucket_start:
+            bucket = self._trend[-1]
+            bucket[1] += 1
+            bucket[2] += latency
+            bucket[3] += latency * latency
         else:
-            model_stat.failed_requests += 1
+            self._trend.append([bucket_start, 1, latency, latency * latency])
 
-        model_stat.total_input_tokens += metrics.input_tokens
-        model_stat.total_output_tokens += metrics.output_tokens
-        model_stat.latencies.append(metrics.latency_ms)
-        if metrics.tokens_per_second > 0:
-            model_stat.tokens_per_second.append(metrics.tokens_per_second)
+        cutoff = now - self.retention_hours * 3600
+        while self._trend[0][0] + self.TREND_BUCKET_SECONDS <= cutoff:
+            self._trend.popleft()
 
-        # Keep stats bounded
-        if len(model_stat.latencies) > self.history_size:
-            model_stat.latencies = model_stat.latencies[-self.history_size:]
-            model_stat.tokens_per_second = model_stat.tokens_per_second[-self.history_size:]
+    def get_windowed_stats(self, window_seconds: float, now: float | None = None) -> dict[str, Any]:
+        """Latency summary for successful requests in the last window_seconds.
 
-        # Update agent stats
-        if metrics.agent:
-            if metrics.agent not in self._agent_stats:
-                self._agent_stats[metrics.agent] = ModelStats(model=metrics.agent)
-
-            agent_stat = self._agent_stats[metrics.agent]
-            agent_stat.total_requests += 1
-            if metrics.success:
-                agent_stat.successful_requests += 1
-            else:
-                agent_stat.failed_requests += 1
-            agent_stat.total_input_tokens += metrics.input_tokens
-            agent_stat.total_output_tokens += metrics.output_tokens
-            agent_stat.latencies.append(metrics.latency_ms)
-            if metrics.tokens_per_second > 0:
-                agent_stat.tokens_per_second.append(metrics.tokens_per_second)
+        Resolution is TREND_BUCKET_SECONDS and the window is capped at
+        retention_hours, independent of history_size.
+
+        Args:
+            window_seconds: How far back to look
+            now: Reference time (defaults to time.time())
+        """
+        if now is None:
+            now = time.time()
+        cutoff = now - window_seconds
+        count = 0
+        total = 0.0
+        total_sq = 0.0
+        for bucket_start, n, bucket_sum, bucket_sq in reversed(self._trend):
+            if bucket_start + self.TREND_BUCKET_SECONDS <= cutoff:
+                break
+            count += n
+            total += bucket_sum
+            total_sq += bucket_sq
+
+        if not count:
+            return {"requests": 0, "avg_latency_ms": 0, "stddev_latency_ms": 0}
+        mean = total / count
+        variance = max(total_sq / count - mean * mean, 0.0)
+        return {
+            "requests": count,
+            "avg_latency_ms": round(mean, 1),
+            "stddev_latency_ms": round(variance**0.5, 1),
+        }
 
     def get_stats(self) -> dict[str, Any]:
         """Get comprehensive performance statistics."""
-        # Calculate overall stats
-        all_latencies = [m.latency_ms for m in self._metrics if m.success]
-        all_tps = [m.tokens_per_second for m in self._metrics if m.success and m.tokens_per_second > 0]
-
         total_requests = len(self._metrics)
-        successful = sum(1 for m in self._metrics if m.success)
+        successful = self._window_successes
+        tps_count = self._window_tps_count
 
         overall = {
             "total_requests": total_requests,
             "successful_requests": successful,
             "success_rate": round((successful / total_requests * 100) if total_requests > 0 else 0, 1),
-            "avg_latency_ms": round(statistics.mean(all_latencies), 1) if all_latencies else 0,
-            "avg_tokens_per_second": round(statistics.mean(all_tps), 1) if all_tps else 0,
+            "avg_latency_ms": round(self._window_latency_sum / successful, 1) if successful else 0,
+            "avg_tokens_per_second": round(self._window_tps_sum / tps_count, 1) if tps_count else 0,
             "active_requests": len(self._active_requests),
         }
 
         return {
             "overall": overall,
+            "last_hour": self.get_windowed_stats(3600),
             "by_model": {k: v.to_dict() for k, v in self._model_stats.items()},
             "by_agent": {k: v.to_dict() for k, v in self._agent_stats.items()},
-            "recent": [m.to_dict() for m in list(self._metrics)[-10:]],
+            "recent": [m.to_dict() for m in self.get_recent_metrics(10)],
         }
 
     def get_model_stats(self, model: str) -> ModelStats | None:
@@ -342,11 +456,18 @@ class PerformanceTracker:
 
     def get_recent_metrics(self, limit: int = 10) -> list[LLMMetrics]:
         """Get most recent metrics."""
-        return list(self._metrics)[-limit:]
+        recent = list(islice(reversed(self._metrics), limit))
+        recent.reverse()
+        return recent
 
     def clear(self) -> None:
         """Clear all tracked metrics."""
         self._metrics.clear()
+        self._window_successes = 0
+        self._window_latency_sum = 0.0
+        self._window_tps_sum = 0.0
+        self._window_tps_count = 0
+        self._trend.clear()
         self._model_stats.clear()
         self._agent_stats.clear()
         self._active_requests.clear()
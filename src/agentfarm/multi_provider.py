@@ -7,6 +7,7 @@ Maps each agent to its optimal LLM provider to maximize free tier usage.
 from __future__ import annotations
 
 import os
+from functools import lru_cache
 
 # Load .env file if present
 try:
@@ -65,12 +66,38 @@ AGENT_PROVIDER_MAP: dict[str, AgentProviderConfig] = {
 }
 
 
+# Default model per provider when falling back
+_DEFAULT_MODELS: dict[str, str] = {
+    "groq": "llama-3.3-70b-versatile",
+    "gemini": "gemini-1.5-flash",
+    "qwen": "Qwen/Qwen2.5-7B-Instruct",
+    "ollama": "llama3.2",
+    "claude": "claude-sonnet-4-20250514",
+}
+
+
+def refresh_provider_availability() -> None:
+    """Forget cached provider availability.
+
+    Availability is read from the environment once and then cached, so
+    call this after changing API key variables at runtime.
+    """
+    _is_provider_available.cache_clear()
+    _available_provider_for.cache_clear()
+
+
 def get_available_provider_for_agent(agent_name: str) -> AgentProviderConfig:
     """Get the best available provider for an agent.
 
     Falls back to other providers if the preferred one isn't available.
     """
-    config = AGENT_PROVIDER_MAP.get(agent_name.lower())
+    return _available_provider_for(agent_name.lower())
+
+
+@lru_cache(maxsize=32)
+def _available_provider_for(agent_name: str) -> AgentProviderConfig:
+    """Resolve a lower-cased agent name; cached per agent."""
+    config = AGENT_PROVIDER_MAP.get(agent_name)
     if not config:
         # Default fallback
         config = AGENT_PROVIDER_MAP["orchestrator"]
@@ -91,6 +118,7 @@ def get_available_provider_for_agent(agent_name: str) -> AgentProviderConfig:
     return config
 
 
+@lru_cache(maxsize=8)
 def _is_provider_available(provider_type: str) -> bool:
     """Check if a provider is available based on API keys."""
     if provider_type == "groq":
@@ -109,14 +137,7 @@ def _is_provider_available(provider_type: str) -> bool:
 
 def _get_default_model(provider_type: str) -> str:
     """Get default model for a provider."""
-    defaults = {
-        "groq": "llama-3.3-70b-versatile",
-        "gemini": "gemini-1.5-flash",
-        "qwen": "Qwen/Qwen2.5-7B-Instruct",
-        "ollama": "llama3.2",
-        "claude": "claude-sonnet-4-20250514",
-    }
-    return defaults.get(provider_type, "llama-3.3-70b-versatile")
+    return _DEFAULT_MODELS.get(provider_type, "llama-3.3-70b-versatile")
 
 
 def create_provider_for_agent(agent_name: str) -> "LLMProvider":
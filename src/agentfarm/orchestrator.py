@@ -1097,8 +1097,6 @@ class Orchestrator:
         review: ReviewResult | None,
     ) -> str:
         """Generate a PR description summarizing the changes."""
-        changed_files = self._collect_changed_files(execution_results)
-
         sections = [
             "## Summary",
             plan.summary,
@@ -1106,10 +1104,11 @@ class Orchestrator:
             "## Changes",
         ]
 
-        for result in execution_results:
-            if result.files_changed:
-                for fc in result.files_changed:
-                    sections.append(f"- `{fc.path}`: {fc.action}")
+        sections.extend(
+            f"- `{fc.path}`: {fc.action}"
+            for result in execution_results
+            for fc in result.files_changed
+        )
 
         sections.extend(["", "## Verification"])
         if verification:
@@ -1128,8 +1127,7 @@ class Orchestrator:
             sections.append(f"- Status: {status}")
             if review.suggestions:
                 sections.append("- Suggestions for future:")
-                for s in review.suggestions:
-                    sections.append(f"  - {s}")
+                sections.extend(f"  - {s}" for s in review.suggestions)
 
         return "\n".join(sections)
 
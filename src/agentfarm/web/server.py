@@ -1791,7 +1791,7 @@ async def api_wireguard_qr_handler(request: web.Request) -> web.Response:
         user = user_manager.get_or_create_user(device_id)
         has_access = (
             user.is_admin or
-            user.tier == SubscriptionTier.EARLY_ACCESS or
+            user.tier is SubscriptionTier.EARLY_ACCESS or
             user.prompts_remaining > 0
         )
         if not has_access:
@@ -1905,7 +1905,11 @@ async def api_user_handler(request: web.Request) -> web.Response:
     can_run, reason = user_manager.can_run_workflow(device_id)
 
     # Determine if user is in tryout mode
-    is_tryout = user.prompts_remaining > 0 and not user.is_admin and user.tier != SubscriptionTier.EARLY_ACCESS
+    is_tryout = (
+        user.prompts_remaining > 0
+        and not user.is_admin
+        and user.tier is not SubscriptionTier.EARLY_ACCESS
+    )
 
     # Check Beta Operator status
     is_beta = user.is_admin or user.tier in (
@@ -1920,7 +1924,11 @@ async def api_user_handler(request: web.Request) -> web.Response:
         "is_admin": user.is_admin,
         "is_beta_operator": is_beta,
         "is_tryout": is_tryout,
-        "prompts_remaining": user.prompts_remaining if not (user.is_admin or user.tier == SubscriptionTier.EARLY_ACCESS) else -1,
+        "prompts_remaining": (
+            user.prompts_remaining
+            if not (user.is_admin or user.tier is SubscriptionTier.EARLY_ACCESS)
+            else -1
+        ),
         "tryout_remaining": user.prompts_remaining if is_tryout else None,
         "prompts_used_total": user.prompts_used_total,
         "can_run_workflow": can_run,
@@ -1980,7 +1988,11 @@ def _user_to_dict(user, is_tryout: bool = False) -> dict:
         "is_admin": user.is_admin,
         "is_beta_operator": is_beta,
         "is_tryout": is_tryout or user.prompts_remaining > 0,
-        "prompts_remaining": user.prompts_remaining if not (user.is_admin or user.tier == SubscriptionTier.EARLY_ACCESS) else -1,
+        "prompts_remaining": (
+            user.prompts_remaining
+            if not (user.is_admin or user.tier is SubscriptionTier.EARLY_ACCESS)
+            else -1
+        ),
         "tryout_remaining": user.prompts_remaining if is_tryout else None,
         "prompts_used_total": user.prompts_used_total,
         # Premium features (Beta Operator only)
@@ -2020,7 +2032,7 @@ async def api_tokens_handler(request: web.Request) -> web.Response:
         "prompts_remaining": user.prompts_remaining,
         "prompts_used_total": user.prompts_used_total,
         "tier": user.tier.value,
-        "unlimited": user.is_admin or user.tier == SubscriptionTier.EARLY_ACCESS,
+        "unlimited": user.is_admin or user.tier is SubscriptionTier.EARLY_ACCESS,
     })
 
 
@@ -2343,6 +2355,14 @@ async def api_stripe_webhook_handler(request: web.Request) -> web.Response:
     elif action == "invalid_signature":
         return web.json_response({"error": "Invalid signature"}, status=400)
 
+    elif action == "disabled":
+        return web.json_response({"error": "Stripe not configured"}, status=503)
+
+    # Only now is the event applied; a failure above leaves it retryable
+    event_id = result.get("event_id")
+    if event_id and action != "duplicate":
+        stripe_integration.mark_processed(event_id)
+
     return web.json_response({"received": True, "action": action})
 
 
@@ -2628,12 +2648,21 @@ async def on_startup(app: web.Application) -> None:
     # Initialize monetization
     agentfarm_dir = Path(current_working_dir) / ".agentfarm"
     user_manager = UserManager(agentfarm_dir)
+    users_loaded = user_manager.preload()
     feedback_manager = FeedbackManager(agentfarm_dir)
     stripe_integration = StripeIntegration()
-    logger.info("Monetization initialized (Stripe enabled: %s)", stripe_integration.enabled)
+    logger.info(
+        "Monetization initialized (Stripe enabled: %s, users: %d)",
+        stripe_integration.enabled,
+        users_loaded,
+    )
 
     # Initialize TierManager (unified access control)
-    tier_manager = TierManager(storage_dir=agentfarm_dir, enable_vault=False)  # Using file-based vault
+    tier_manager = TierManager(
+        storage_dir=agentfarm_dir,
+        enable_vault=False,  # Using file-based vault
+        users=user_manager,  # Share the profile cache
+    )
     logger.info("Tier manager initialized")
 
     # Initialize ContextInjector for RAG indexing (if available)
@@ -2675,6 +2704,12 @@ async def on_cleanup(app: web.Application) -> None:
         _event_bus_task.cancel()
     if llm_router:
         await llm_router.close()
+    if stripe_integration:
+        await stripe_integration.close()
+    if user_manager:
+        user_manager.close()
+    if gpu_monitor:
+        gpu_monitor.close()
 
 
 def create_app() -> web.Application:
@@ -0,0 +1,247 @@
+"""Tests for GPU monitor output parsing."""
+
+from __future__ import annotations
+
+import asyncio
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from agentfarm.monitoring import gpu_monitor
+from agentfarm.monitoring.gpu_monitor import (
+    GPUMonitor,
+    GPUStats,
+    _parse_rocm_json,
+    _parse_rocm_output,
+)
+
+ROCM_OUTPUT = """
+============================ ROCm System Management Interface ============================
+=================================== Temperature ====================================
+GPU[0]		: Temperature (Sensor edge) (C): 45.0
+GPU[0]		: Temperature (Sensor junction) (C): 52.0
+GPU[0]		: Temperature (Sensor memory) (C): 60.0
+GPU[1]		: Temperature (Sensor edge) (C): 99.0
+================================ Current Socket Power ================================
+GPU[0]		: Average Graphics Package Power (W): 35.0
+=================================== % time GPU is busy ===================================
+GPU[0]		: GPU use (%): 12
+================================== Memory Usage (Bytes) ==================================
+GPU[0]		: VRAM Total Memory (B): 17163091968
+GPU[0]		: VRAM Total Used Memory (B): 1073741824
+"""
+
+
+class TestRocmParsing:
+    """Tests for rocm-smi text parsing."""
+
+    def test_parses_all_readings(self) -> None:
+        stats = GPUStats(vendor="AMD")
+        _parse_rocm_output(ROCM_OUTPUT, stats)
+        assert stats.temp_edge == 45.0
+        assert stats.temp_junction == 52.0
+        assert stats.temp_memory == 60.0
+        assert stats.power_draw == 35.0
+        assert stats.gpu_util == 12.0
+        assert stats.vram_total == 17163091968
+        assert stats.vram_used == 1073741824
+
+    def test_missing_readings_keep_defaults(self) -> None:
+        stats = GPUStats(vendor="AMD")
+        _parse_rocm_output("GPU[0]		: GPU use (%): 3\n", stats)
+        assert stats.gpu_util == 3.0
+        assert stats.temp_edge is None
+        assert stats.vram_total == 0
+
+    def test_parses_json_output(self) -> None:
+        data = {
+            "card0": {
+                "Temperature (Sensor edge) (C)": "45.0",
+                "Temperature (Sensor junction) (C)": "52.0",
+                "Current Socket Graphics Package Power (W)": "35.0",
+                "GPU use (%)": "12",
+                "VRAM Total Memory (B)": "17163091968",
+                "VRAM Total Used Memory (B)": "1073741824",
+                "Temperature (Sensor memory) (C)": "N/A",
+            },
+            "card1": {"GPU use (%)": "99"},
+        }
+        stats = GPUStats(vendor="AMD")
+        _parse_rocm_json(data, stats)
+        assert stats.temp_edge == 45.0
+        assert stats.temp_junction == 52.0
+        assert stats.temp_memory is None
+        assert stats.power_draw == 35.0
+        assert stats.gpu_util == 12.0
+        assert stats.vram_total == 17163091968
+        assert stats.vram_used == 1073741824
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_text_output(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        calls: list[tuple[str, ...]] = []
+
+        async def fake_run(*args: str) -> bytes:
+            calls.append(args)
+            if "--json" in args:
+                return b"rocm-smi: unrecognized arguments: --json"
+            return ROCM_OUTPUT.encode()
+
+        monkeypatch.setattr(gpu_monitor, "STATS_CACHE_TTL", 0.0)
+        monitor = GPUMonitor()
+        monitor._rocm_smi = "rocm-smi"
+        monitor._gpu_name = "Test GPU"
+        monkeypatch.setattr(monitor, "_run_rocm_smi", fake_run)
+
+        stats = await monitor.get_stats()
+        assert stats.gpu_util == 12.0
+        stats = await monitor.get_stats()
+        assert stats.temp_edge == 45.0
+        assert sum("--json" in args for args in calls) == 1
+
+
+    @pytest.mark.asyncio
+    async def test_failed_json_call_falls_back_to_text(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        calls: list[tuple[str, ...]] = []
+
+        async def fake_run(*args: str) -> bytes:
+            calls.append(args)
+            if "--json" in args:
+                raise subprocess.CalledProcessError(
+                    2, ["rocm-smi", *args], b"", b"unrecognized arguments: --json"
+                )
+            return ROCM_OUTPUT.encode()
+
+        monkeypatch.setattr(gpu_monitor, "STATS_CACHE_TTL", 0.0)
+        monitor = GPUMonitor()
+        monitor._rocm_smi = "rocm-smi"
+        monitor._gpu_name = "Test GPU"
+        monkeypatch.setattr(monitor, "_run_rocm_smi", fake_run)
+
+        stats = await monitor.get_stats()
+        assert stats.gpu_util == 12.0
+        assert monitor._rocm_json is False
+        await monitor.get_stats()
+        assert sum("--json" in args for args in calls) == 1
+
+
+class TestStatsCache:
+    """Tests for sharing readings between callers."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_read(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        reads = 0
+
+        async def fake_read(gpu_id: int) -> GPUStats:
+            nonlocal reads
+            reads += 1
+            await asyncio.sleep(0.01)
+            return GPUStats(gpu_id=gpu_id)
+
+        monitor = GPUMonitor()
+        monkeypatch.setattr(monitor, "_read_stats", fake_read)
+        results = await asyncio.gather(*(monitor.get_stats() for _ in range(5)))
+        assert reads == 1
+        assert all(r == results[0] for r in results)
+
+        await monitor.get_stats(gpu_id=1)
+        assert reads == 2
+
+    @pytest.mark.asyncio
+    async def test_callers_get_independent_copies(self) -> None:
+        monitor = GPUMonitor()
+        first = await monitor.get_stats()
+        first.name = "changed"
+        first.vram_used = 123
+
+        second = await monitor.get_stats()
+        assert second is not first
+        assert second.name != "changed"
+        assert second.vram_used != 123
+
+    @pytest.mark.asyncio
+    async def test_expired_reading_refreshed(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(gpu_monitor, "STATS_CACHE_TTL", 0.0)
+        monitor = GPUMonitor()
+        first = await monitor.get_stats()
+        assert await monitor.get_stats() is not first
+
+
+class _FakeNVML:
+    """Minimal stand-in for the pynvml module."""
+
+    NVML_TEMPERATURE_GPU = 0
+
+    def __init__(self) -> None:
+        self.handle_lookups = 0
+        self.shutdowns = 0
+
+    def nvmlInit(self) -> None:
+        pass
+
+    def nvmlShutdown(self) -> None:
+        self.shutdowns += 1
+
+    def nvmlDeviceGetHandleByIndex(self, index: int) -> int:
+        self.handle_lookups += 1
+        return index
+
+    def nvmlDeviceGetName(self, handle: int) -> bytes:
+        return b"Test RTX"
+
+    def nvmlDeviceGetTemperature(self, handle: int, sensor: int) -> int:
+        return 61
+
+    def nvmlDeviceGetMemoryInfo(self, handle: int) -> SimpleNamespace:
+        return SimpleNamespace(used=2 * 1024**3, total=8 * 1024**3)
+
+    def nvmlDeviceGetUtilizationRates(self, handle: int) -> SimpleNamespace:
+        return SimpleNamespace(gpu=40, memory=20)
+
+    def nvmlDeviceGetPowerUsage(self, handle: int) -> int:
+        return 150_000
+
+
+class TestNVML:
+    """Tests for in-process NVIDIA readings."""
+
+    @pytest.mark.asyncio
+    async def test_reads_through_nvml(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        fake = _FakeNVML()
+        monkeypatch.setattr(gpu_monitor, "pynvml", fake)
+        monkeypatch.setattr(gpu_monitor, "STATS_CACHE_TTL", 0.0)
+        monitor = GPUMonitor()
+        monitor._rocm_smi = None
+
+        stats = await monitor.get_stats()
+        assert monitor.vendor == "NVIDIA"
+        assert stats.name == "Test RTX"
+        assert stats.temp_junction == 61.0
+        assert stats.vram_total_gb == 8.0
+        assert stats.gpu_util == 40.0
+        assert stats.power_draw == 150.0
+
+        await monitor.get_stats()
+        assert fake.handle_lookups == 1
+
+    def test_close_shuts_down_nvml_once(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        fake = _FakeNVML()
+        monkeypatch.setattr(gpu_monitor, "pynvml", fake)
+        monitor = GPUMonitor()
+
+        monitor.close()
+        monitor.close()
+        assert fake.shutdowns == 1
+        assert not monitor._nvml
+
+
+class TestGPUStats:
+    """Tests for the stats snapshot."""
+
+    def test_slotted(self) -> None:
+        stats = GPUStats(vram_total=4 * 1024**3, vram_used=1024**3)
+        assert not hasattr(stats, "__dict__")
+        assert stats.vram_percent == 25.0
+        assert stats.vram_free == 3 * 1024**3
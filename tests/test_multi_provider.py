@@ -0,0 +1,43 @@
+"""Tests for multi-provider agent assignment."""
+
+from __future__ import annotations
+
+import pytest
+
+from agentfarm import multi_provider
+from agentfarm.multi_provider import (
+    AGENT_PROVIDER_MAP,
+    AgentProviderConfig,
+    get_available_provider_for_agent,
+    refresh_provider_availability,
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    refresh_provider_availability()
+    yield
+    refresh_provider_availability()
+
+
+class TestProviderAvailability:
+    """Tests for cached provider availability."""
+
+    def test_agent_lookup_is_case_insensitive(self) -> None:
+        assert get_available_provider_for_agent("Executor") is AGENT_PROVIDER_MAP["executor"]
+
+    def test_availability_cached_until_refresh(self, monkeypatch) -> None:
+        monkeypatch.setitem(
+            AGENT_PROVIDER_MAP,
+            "cloud",
+            AgentProviderConfig(provider_type="groq", model="m", description="d"),
+        )
+        monkeypatch.delenv("GROQ_API_KEY", raising=False)
+        assert get_available_provider_for_agent("cloud").provider_type == "ollama"
+
+        monkeypatch.setenv("GROQ_API_KEY", "key")
+        assert get_available_provider_for_agent("cloud").provider_type == "ollama"
+
+        refresh_provider_availability()
+        assert get_available_provider_for_agent("cloud").provider_type == "groq"
+        assert multi_provider._is_provider_available("groq")
@@ -0,0 +1,184 @@
+"""Tests for the LLM performance tracker."""
+
+from __future__ import annotations
+
+import random
+import statistics
+
+from agentfarm.monitoring import performance
+from agentfarm.monitoring.performance import LLMMetrics, ModelStats, PerformanceTracker
+
+
+class TestModelStats:
+    """Tests for windowed latency/throughput aggregation."""
+
+    def test_percentiles_match_nearest_rank(self) -> None:
+        stats = ModelStats(model="m")
+        samples = [float(v) for v in range(100, 0, -1)]
+        for value in samples:
+            stats.record(value, value / 10)
+
+        ordered = sorted(samples)
+        assert stats.p50_latency_ms == statistics.median(samples)
+        assert stats.p95_latency_ms == ordered[95]
+        assert stats.p99_latency_ms == ordered[99]
+        assert stats.avg_latency_ms == statistics.mean(samples)
+        assert stats.avg_tokens_per_second == statistics.mean(v / 10 for v in samples)
+
+    def test_window_is_bounded(self) -> None:
+        stats = ModelStats(model="m", history_size=3)
+        for value in (1.0, 2.0, 3.0, 100.0, 200.0):
+            stats.record(value, value)
+
+        assert list(stats.latencies) == [3.0, 100.0, 200.0]
+        assert stats.avg_latency_ms == statistics.mean([3.0, 100.0, 200.0])
+        assert stats.avg_tokens_per_second == statistics.mean([3.0, 100.0, 200.0])
+        assert stats.p99_latency_ms == 200.0
+
+    def test_percentiles_refresh_after_new_sample(self) -> None:
+        stats = ModelStats(model="m")
+        stats.record(10.0, 0)
+        stats.record(20.0, 0)
+        assert stats.p99_latency_ms == 20.0
+
+        stats.record(500.0, 0)
+        assert stats.p99_latency_ms == 500.0
+        assert stats.p50_latency_ms == 20.0
+
+    def test_sorted_window_tracks_evictions(self) -> None:
+        rng = random.Random(7)
+        stats = ModelStats(model="m", history_size=50)
+        for _ in range(500):
+            stats.record(float(rng.randint(1, 20)), 0)
+            assert stats._sorted_latencies == sorted(stats.latencies)
+
+    def test_to_dict_cached_until_next_sample(self) -> None:
+        stats = ModelStats(model="m")
+        stats.total_requests = 1
+        stats.record(10.0, 5.0)
+        first = stats.to_dict()
+        assert stats.to_dict() == first
+        assert stats._cached_dict is not None
+
+        stats.total_requests = 2
+        stats.record(30.0, 5.0)
+        second = stats.to_dict()
+        assert second != first
+        assert second["total_requests"] == 2
+        assert second["latency_ms"]["avg"] == 20.0
+
+    def test_to_dict_returns_independent_copies(self) -> None:
+        stats = ModelStats(model="m")
+        stats.record(10.0, 5.0)
+        first = stats.to_dict()
+        first["model"] = "changed"
+        first["tokens"]["input"] = 99
+        first["latency_ms"]["avg"] = -1.0
+
+        second = stats.to_dict()
+        assert second["model"] == "m"
+        assert second["tokens"]["input"] == 0
+        assert second["latency_ms"]["avg"] == 10.0
+
+    def test_add_updates_counters(self) -> None:
+        stats = ModelStats(model="m")
+        stats.add(LLMMetrics(model="m", latency_ms=10.0, input_tokens=3, output_tokens=4))
+        stats.add(LLMMetrics(model="m", latency_ms=30.0, success=False))
+
+        result = stats.to_dict()
+        assert result["total_requests"] == 2
+        assert result["success_rate"] == 50.0
+        assert result["tokens"] == {"input": 3, "output": 4, "total": 7}
+        assert result["latency_ms"]["avg"] == 20.0
+
+    def test_zero_throughput_is_not_recorded(self) -> None:
+        stats = ModelStats(model="m")
+        stats.record(10.0, 0)
+        assert stats.avg_tokens_per_second == 0.0
+        assert stats.avg_latency_ms == 10.0
+
+
+class TestPerformanceTracker:
+    """Tests for PerformanceTracker aggregation."""
+
+    def test_agent_stats_are_bounded(self) -> None:
+        tracker = PerformanceTracker(history_size=5)
+        for _ in range(20):
+            metrics = tracker.start_request(model="m", agent="executor")
+            tracker.complete_request(metrics, input_tokens=10, output_tokens=5)
+
+        stats = tracker.get_stats()
+        assert stats["by_model"]["m"]["total_requests"] == 20
+        assert stats["by_agent"]["executor"]["total_requests"] == 20
+        assert len(tracker._agent_stats["executor"].latencies) == 5
+        assert len(tracker.get_model_stats("m").latencies) == 5
+
+    def test_overall_stats_track_window(self, monkeypatch) -> None:
+        tracker = PerformanceTracker(history_size=4)
+        # (success, latency_ms, output_tokens)
+        requests = [
+            (True, 100.0, 5),
+            (False, 900.0, 0),
+            (True, 200.0, 0),
+            (True, 300.0, 9),
+            (True, 400.0, 16),
+            (False, 10.0, 0),
+        ]
+        clock = iter(t for _, latency, _ in requests for t in (0, int(latency * 1_000_000)))
+        monkeypatch.setattr(performance.time, "perf_counter_ns", lambda: next(clock))
+
+        for success, _, output_tokens in requests:
+            metrics = tracker.start_request(model="m")
+            tracker.complete_request(metrics, output_tokens=output_tokens, success=success)
+
+        overall = tracker.get_stats()["overall"]
+        assert overall["total_requests"] == 4
+        assert overall["successful_requests"] == 3
+        assert overall["avg_latency_ms"] == 300.0
+        assert overall["avg_tokens_per_second"] == 35.0
+
+        tracker.clear()
+        overall = tracker.get_stats()["overall"]
+        assert overall["successful_requests"] == 0
+        assert overall["avg_latency_ms"] == 0
+
+    def test_windowed_stats(self) -> None:
+        tracker = PerformanceTracker(retention_hours=1)
+        base = 1_000_000.0 - 1_000_000.0 % 60
+        for offset, latency in ((0, 100.0), (30, 300.0), (1800, 200.0), (3590, 400.0)):
+            metrics = performance.LLMMetrics(model="m", latency_ms=latency, end_time=base + offset)
+            tracker._record_trend(metrics)
+
+        now = base + 3599
+        assert tracker.get_windowed_stats(60, now=now)["requests"] == 1
+        stats = tracker.get_windowed_stats(3600, now=now)
+        assert stats["requests"] == 4
+        assert stats["avg_latency_ms"] == 250.0
+        assert stats["stddev_latency_ms"] == round(statistics.pstdev([100, 300, 200, 400]), 1)
+
+        # Buckets older than retention_hours are dropped on the next record
+        later = performance.LLMMetrics(model="m", latency_ms=50.0, end_time=base + 3600 + 1900)
+        tracker._record_trend(later)
+        stats = tracker.get_windowed_stats(7200, now=later.end_time)
+        assert stats["requests"] == 2
+        assert stats["avg_latency_ms"] == 225.0
+
+    def test_metrics_use_slots(self) -> None:
+        tracker = PerformanceTracker()
+        metrics = tracker.start_request(model="m", request_id="r1")
+        assert not hasattr(metrics, "__dict__")
+        assert tracker.complete_by_id("r1", output_tokens=3) is metrics
+        assert not hasattr(tracker.get_model_stats("m"), "__dict__")
+
+    def test_latency_uses_monotonic_clock(self, monkeypatch) -> None:
+        tracker = PerformanceTracker()
+        metrics = tracker.start_request(model="m")
+        # A wall-clock jump must not affect the measured latency
+        monkeypatch.setattr(performance.time, "time", lambda: metrics.start_time - 3600)
+        end_ns = metrics.start_ns + 250_000_000
+        monkeypatch.setattr(performance.time, "perf_counter_ns", lambda: end_ns)
+        tracker.complete_request(metrics, output_tokens=50)
+
+        assert metrics.latency_ns == 250_000_000
+        assert metrics.latency_ms == 250.0
+        assert metrics.tokens_per_second == 200.0
@@ -0,0 +1,323 @@
+"""Tests for Stripe webhook handling."""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import time
+
+import httpx
+import pytest
+
+from agentfarm.monetization.stripe_integration import (
+    INLINE_VERIFY_MAX_BYTES,
+    MAX_WEBHOOK_BYTES,
+    STRIPE_API_TIMEOUT,
+    StripeConfig,
+    StripeIntegration,
+    _parse_sig_header,
+)
+
+WEBHOOK_SECRET = "whsec_test_secret"
+
+
+def _sign(payload: bytes, timestamp: int | None = None, secret: str = WEBHOOK_SECRET) -> str:
+    ts = str(int(time.time()) if timestamp is None else timestamp)
+    sig = hmac.new(secret.encode(), ts.encode() + b"." + payload, hashlib.sha256).hexdigest()
+    return f"t={ts},v1={sig}"
+
+
+def _event(event_type: str, obj: dict) -> bytes:
+    return json.dumps(
+        {"id": "evt_1", "type": event_type, "created": 1700000000, "data": {"object": obj}}
+    ).encode()
+
+
+@pytest.fixture
+def stripe() -> StripeIntegration:
+    return StripeIntegration(StripeConfig(secret_key="sk_test", webhook_secret=WEBHOOK_SECRET))
+
+
+class TestSignatureVerification:
+    """Tests for verify_webhook_signature."""
+
+    def test_valid_signature(self, stripe: StripeIntegration) -> None:
+        payload = _event("invoice.payment_failed", {"customer": "cus_1"})
+        assert stripe.verify_webhook_signature(payload, _sign(payload))
+
+    def test_non_ascii_payload(self, stripe: StripeIntegration) -> None:
+        payload = _event("invoice.payment_failed", {"customer": "cus_åäö"})
+        assert stripe.verify_webhook_signature(payload, _sign(payload))
+
+    def test_rolled_secret(self, stripe: StripeIntegration) -> None:
+        # During a secret roll Stripe signs with both the old and new secret
+        payload = _event("invoice.payment_failed", {})
+        old = _sign(payload, secret="whsec_old_secret")
+        new = _sign(payload)
+        header = new + ",v1=" + old.split("v1=")[1]
+        assert stripe.verify_webhook_signature(payload, header)
+        assert not stripe.verify_webhook_signature(payload, old)
+
+    def test_signature_after_complete_pair(self, stripe: StripeIntegration) -> None:
+        # The matching v1 follows a full t/v1 pair, so the whole header must be scanned
+        payload = _event("invoice.payment_failed", {})
+        old = _sign(payload, secret="whsec_old_secret")
+        new_sig = _sign(payload).split("v1=")[1]
+        assert stripe.verify_webhook_signature(payload, f"{old},v1={new_sig}")
+        assert stripe.verify_webhook_signature(payload, f"{old},v1=not-hex,v1={new_sig}")
+
+    def test_wrong_secret(self, stripe: StripeIntegration) -> None:
+        payload = _event("invoice.payment_failed", {})
+        assert not stripe.verify_webhook_signature(payload, _sign(payload, secret="whsec_other"))
+
+    def test_tampered_payload(self, stripe: StripeIntegration) -> None:
+        payload = _event("invoice.payment_failed", {})
+        assert not stripe.verify_webhook_signature(payload + b" ", _sign(payload))
+
+    def test_stale_timestamp(self, stripe: StripeIntegration) -> None:
+        payload = _event("invoice.payment_failed", {})
+        assert not stripe.verify_webhook_signature(payload, _sign(payload, int(time.time()) - 600))
+
+    def test_missing_fields(self, stripe: StripeIntegration) -> None:
+        payload = _event("invoice.payment_failed", {})
+        assert not stripe.verify_webhook_signature(payload, "")
+        assert not stripe.verify_webhook_signature(payload, "t=123")
+        assert not stripe.verify_webhook_signature(payload, "v1=abc")
+
+    def test_disabled(self) -> None:
+        stripe = StripeIntegration(StripeConfig(secret_key="", webhook_secret=""))
+        payload = _event("invoice.payment_failed", {})
+        assert not stripe.verify_webhook_signature(payload, _sign(payload))
+
+
+class TestHandleWebhook:
+    """Tests for handle_webhook dispatch."""
+
+    @pytest.mark.asyncio
+    async def test_checkout_subscription(self, stripe: StripeIntegration) -> None:
+        payload = _event(
+            "checkout.session.completed",
+            {"client_reference_id": "dev1", "mode": "subscription", "customer": "cus_1"},
+        )
+        result = await stripe.handle_webhook(payload, _sign(payload))
+        assert result == {
+            "action": "upgrade_tier",
+            "device_id": "dev1",
+            "tier": "early_access",
+            "stripe_customer_id": "cus_1",
+            "event_id": "evt_1",
+        }
+
+    @pytest.mark.asyncio
+    async def test_checkout_token_pack(self, stripe: StripeIntegration) -> None:
+        payload = _event(
+            "checkout.session.completed",
+            {
+                "client_reference_id": "dev1",
+                "mode": "payment",
+                "metadata": {"product_type": "token_pack_medium"},
+            },
+        )
+        result = await stripe.handle_webhook(payload, _sign(payload))
+        assert result["action"] == "add_tokens"
+        assert result["tokens"] == 2000
+
+    @pytest.mark.asyncio
+    async def test_subscription_deleted(self, stripe: StripeIntegration) -> None:
+        payload = _event("customer.subscription.deleted", {"metadata": {"device_id": "dev1"}})
+        result = await stripe.handle_webhook(payload, _sign(payload))
+        assert result == {
+            "action": "downgrade_tier",
+            "device_id": "dev1",
+            "tier": "free",
+            "event_id": "evt_1",
+        }
+
+    @pytest.mark.asyncio
+    async def test_unhandled_event(self, stripe: StripeIntegration) -> None:
+        payload = _event("charge.refunded", {})
+        result = await stripe.handle_webhook(payload, _sign(payload))
+        assert result == {"action": "ignored", "event_type": "charge.refunded"}
+
+    @pytest.mark.asyncio
+    async def test_large_payload_verified_off_loop(self, stripe: StripeIntegration) -> None:
+        payload = _event("charge.refunded", {"padding": "x" * (INLINE_VERIFY_MAX_BYTES + 1)})
+        result = await stripe.handle_webhook(payload, _sign(payload))
+        assert result == {"action": "ignored", "event_type": "charge.refunded"}
+
+    @pytest.mark.asyncio
+    async def test_invalid_signature(self, stripe: StripeIntegration) -> None:
+        payload = _event("charge.refunded", {})
+        result = await stripe.handle_webhook(payload, "t=1,v1=00")
+        assert result["action"] == "invalid_signature"
+
+    @pytest.mark.asyncio
+    async def test_duplicate_event(self, stripe: StripeIntegration) -> None:
+        payload = _event("customer.subscription.deleted", {"metadata": {"device_id": "dev1"}})
+        first = await stripe.handle_webhook(payload, _sign(payload))
+        assert first["action"] == "downgrade_tier"
+        assert first["event_id"] == "evt_1"
+        stripe.mark_processed(first["event_id"])
+
+        second = await stripe.handle_webhook(payload, _sign(payload))
+        assert second == {"action": "duplicate", "event_id": "evt_1"}
+
+    @pytest.mark.asyncio
+    async def test_retry_after_failed_apply(self, stripe: StripeIntegration) -> None:
+        # The caller failed to apply the first delivery, so never marked it
+        payload = _event("customer.subscription.deleted", {"metadata": {"device_id": "dev1"}})
+        first = await stripe.handle_webhook(payload, _sign(payload))
+        retry = await stripe.handle_webhook(payload, _sign(payload))
+        assert first["action"] == retry["action"] == "downgrade_tier"
+
+        stripe.mark_processed(retry["event_id"])
+        third = await stripe.handle_webhook(payload, _sign(payload))
+        assert third["action"] == "duplicate"
+
+    @pytest.mark.asyncio
+    async def test_disabled(self) -> None:
+        stripe = StripeIntegration(StripeConfig(secret_key="", webhook_secret=""))
+        payload = _event("charge.refunded", {})
+        result = await stripe.handle_webhook(payload, _sign(payload))
+        assert result["action"] == "disabled"
+
+
+class TestParseWebhookEvent:
+    """Tests for parse_webhook_event."""
+
+    def test_parse(self, stripe: StripeIntegration) -> None:
+        event = stripe.parse_webhook_event(_event("invoice.payment_failed", {"customer": "cus_1"}))
+        assert event is not None
+        assert event.id == "evt_1"
+        assert event.type == "invoice.payment_failed"
+        assert event.data == {"customer": "cus_1"}
+        assert event.created == 1700000000
+
+    def test_missing_object(self, stripe: StripeIntegration) -> None:
+        for body in (b'{"id": "e", "type": "t"}', b'{"id": "e", "type": "t", "data": null}'):
+            event = stripe.parse_webhook_event(body)
+            assert event is not None
+            assert event.data == {}
+
+    def test_invalid_json(self, stripe: StripeIntegration) -> None:
+        assert stripe.parse_webhook_event(b"{not json") is None
+
+    def test_missing_fields(self, stripe: StripeIntegration) -> None:
+        assert stripe.parse_webhook_event(b'{"id": "evt_1"}') is None
+
+
+class TestParseSigHeader:
+    """Tests for the Stripe-Signature header parser."""
+
+    def test_basic(self) -> None:
+        assert _parse_sig_header("t=123,v1=abc") == ("123", ["abc"])
+
+    def test_extra_schemes(self) -> None:
+        assert _parse_sig_header("t=123,v0=old,v1=abc,v1=def") == ("123", ["abc", "def"])
+
+    def test_missing(self) -> None:
+        assert _parse_sig_header("") == ("", [])
+        assert _parse_sig_header("garbage") == ("", [])
+        assert _parse_sig_header("v1=abc") == ("", ["abc"])
+
+
+class TestSignatureRejection:
+    """Tests for requests rejected before hashing."""
+
+    def test_malformed_timestamp(self, stripe: StripeIntegration) -> None:
+        payload = _event("invoice.payment_failed", {})
+        assert not stripe.verify_webhook_signature(payload, "t=abc,v1=00")
+        assert not stripe.verify_webhook_signature(payload, "t=-1,v1=00")
+        assert not stripe.verify_webhook_signature(payload, "t=\u00b2,v1=00")
+
+    def test_overlong_timestamp(self, stripe: StripeIntegration) -> None:
+        # Longer than int()'s default 4300-digit conversion limit
+        payload = _event("invoice.payment_failed", {})
+        assert not stripe.verify_webhook_signature(payload, f"t={'9' * 5000},v1=00")
+        assert not stripe.verify_webhook_signature(payload, f"t={'0' * 13},v1=00")
+
+    def test_oversized_payload(self, stripe: StripeIntegration) -> None:
+        payload = b"x" * (MAX_WEBHOOK_BYTES + 1)
+        assert not stripe.verify_webhook_signature(payload, _sign(payload))
+
+    def test_non_hex_signature(self, stripe: StripeIntegration) -> None:
+        payload = _event("invoice.payment_failed", {})
+        assert not stripe.verify_webhook_signature(payload, f"t={int(time.time())},v1=not-hex")
+
+
+class TestHttpClient:
+    """Tests for the shared Stripe API client."""
+
+    @pytest.mark.asyncio
+    async def test_client_reused_and_closed(self, stripe: StripeIntegration) -> None:
+        client = await stripe._get_http_client()
+        assert await stripe._get_http_client() is client
+        assert client.timeout == httpx.Timeout(STRIPE_API_TIMEOUT)
+        await stripe.close()
+        assert client.is_closed
+        assert stripe._http_client is None
+
+
+class TestCreateCheckoutSession:
+    """Tests for create_checkout_session request building."""
+
+    @pytest.mark.asyncio
+    async def test_form_fields(self) -> None:
+        stripe = StripeIntegration(
+            StripeConfig(
+                secret_key="sk_test",
+                webhook_secret=WEBHOOK_SECRET,
+                prompt_pack_price_id="price_pack",
+            )
+        )
+        sent: dict = {}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            assert str(request.url) == "https://api.stripe.com/v1/checkout/sessions"
+            sent.update(dict(httpx.QueryParams(request.content.decode())))
+            return httpx.Response(200, json={"id": "cs_1", "url": "https://checkout"})
+
+        stripe._http_client = httpx.AsyncClient(
+            base_url=stripe.STRIPE_API_BASE,
+            transport=httpx.MockTransport(handler),
+            auth=("sk_test", ""),
+        )
+        session = await stripe.create_checkout_session("dev1", "prompt_pack")
+        await stripe.close()
+
+        assert session is not None
+        assert session.url == "https://checkout"
+        assert sent == {
+            "line_items[0][quantity]": "1",
+            "success_url": stripe.config.success_url,
+            "cancel_url": stripe.config.cancel_url,
+            "mode": "payment",
+            "line_items[0][price]": "price_pack",
+            "client_reference_id": "dev1",
+            "metadata[device_id]": "dev1",
+            "metadata[product_type]": "prompt_pack",
+        }
+
+
+class TestCheckoutUrl:
+    """Tests for create_checkout_url product resolution."""
+
+    def test_known_products(self) -> None:
+        stripe = StripeIntegration(
+            StripeConfig(
+                secret_key="sk_test",
+                webhook_secret=WEBHOOK_SECRET,
+                early_access_price_id="price_ea",
+                token_pack_price_ids={"small": "price_small", "medium": "", "large": ""},
+            )
+        )
+        assert "product=early_access" in stripe.create_checkout_url("dev1", "early_access")
+        assert "product=token_pack_small" in stripe.create_checkout_url("dev1", "token_pack_small")
+
+    def test_unconfigured_products(self, stripe: StripeIntegration) -> None:
+        assert stripe.create_checkout_url("dev1", "prompt_pack").endswith("error=invalid_product")
+        assert stripe.create_checkout_url("dev1", "token_pack_medium").endswith(
+            "error=invalid_product"
+        )
+        assert stripe.create_checkout_url("dev1", "bogus").endswith("error=invalid_product")
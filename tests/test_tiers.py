@@ -0,0 +1,90 @@
+"""Tests for tier management."""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from agentfarm.monetization.tiers import AccessLevel, TierLimits, TierManager
+from agentfarm.monetization.users import SubscriptionTier
+
+
+@pytest.fixture
+def tiers(tmp_path: Path) -> Iterator[TierManager]:
+    tiers = TierManager(storage_dir=tmp_path, enable_vault=False)
+    yield tiers
+    tiers.users.close()
+
+
+class TestTierLimits:
+    """Tests for TierLimits."""
+
+    def test_singletons(self) -> None:
+        assert TierLimits.free() is TierLimits.free()
+        assert TierLimits.early_access() is TierLimits.early_access()
+
+    def test_immutable(self) -> None:
+        with pytest.raises(AttributeError):
+            TierLimits.free().workflows_per_day = 100  # type: ignore[misc]
+
+
+class TestTierManager:
+    """Tests for TierManager access checks."""
+
+    def test_new_user_is_free(self, tiers: TierManager) -> None:
+        access, limits = tiers.get_user_tier("dev1")
+        assert access == AccessLevel.FREE
+        assert limits is TierLimits.free()
+        assert tiers.get_user_tier("dev1") is tiers.get_user_tier("dev2")
+
+    def test_early_access(self, tiers: TierManager) -> None:
+        tiers.users.upgrade_tier("dev1", SubscriptionTier.EARLY_ACCESS)
+        access, limits = tiers.get_user_tier("dev1")
+        assert access == AccessLevel.EARLY_ACCESS
+        assert limits is TierLimits.early_access()
+        assert tiers.check_workflow_access("dev1") == (True, "early_access")
+
+    def test_company_context_requires_early_access(self, tiers: TierManager) -> None:
+        ok, _ = tiers.set_company_context("dev1", "ACME")
+        assert not ok
+        assert tiers.get_company_context("dev1") is None
+
+        tiers.users.upgrade_tier("dev1", SubscriptionTier.EARLY_ACCESS)
+        ok, _ = tiers.set_company_context("dev1", "ACME")
+        assert ok
+        assert tiers.get_company_context("dev1") == "ACME"
+
+    def test_stats_cached_until_payment(self, tiers: TierManager) -> None:
+        tiers.get_user_tier("dev1")
+        stats = tiers.get_stats()
+        assert stats["total_users"] == 1
+        assert stats["tier_distribution"]["early_access"] == 0
+
+        tiers.get_user_tier("dev2")
+        assert tiers.get_stats() == stats
+
+        tiers.handle_payment_success("dev1", "early_access")
+        stats = tiers.get_stats()
+        assert stats["total_users"] == 2
+        assert stats["tier_distribution"]["early_access"] == 1
+
+    def test_stats_copy_per_caller(self, tiers: TierManager) -> None:
+        tiers.get_user_tier("dev1")
+        stats = tiers.get_stats()
+        stats["total_users"] = 99
+        stats["tier_distribution"]["free"] = 99
+        stats["vault"]["available"] = "changed"
+
+        again = tiers.get_stats()
+        assert again["total_users"] == 1
+        assert again["tier_distribution"]["free"] != 99
+        assert again["vault"]["available"] != "changed"
+
+    def test_stats_count_all_users(self, tiers: TierManager) -> None:
+        for i in range(150):
+            tiers.get_user_tier(f"dev{i}")
+        stats = tiers.get_stats()
+        assert stats["total_users"] == 150
+        assert stats["tier_distribution"]["tryout"] == 150
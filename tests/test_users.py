@@ -0,0 +1,388 @@
+"""Tests for user management and the transaction log."""
+
+from __future__ import annotations
+
+import json
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from agentfarm.monetization import users as users_module
+from agentfarm.monetization.users import SubscriptionTier, UserManager, UserProfile
+
+
+@pytest.fixture
+def manager(tmp_path: Path) -> Iterator[UserManager]:
+    manager = UserManager(tmp_path)
+    yield manager
+    manager.close()
+
+
+class TestUserProfiles:
+    """Tests for profile creation and persistence."""
+
+    def test_new_user_gets_tryout(self, manager: UserManager) -> None:
+        user = manager.get_or_create_user("dev1")
+        assert user.tier == SubscriptionTier.TRYOUT
+        assert user.prompts_remaining == 1
+        assert manager.get_user("dev1") is not None
+
+    def test_explicit_now(self, manager: UserManager) -> None:
+        user = manager.get_or_create_user("dev1", now=100.0)
+        assert user.created_at == user.last_active == 100.0
+        assert manager.get_or_create_user("dev1", now=200.0).last_active == 200.0
+
+    def test_unknown_user(self, manager: UserManager) -> None:
+        assert manager.get_user("nobody") is None
+
+    def test_persists_across_instances(self, tmp_path: Path) -> None:
+        first = UserManager(tmp_path)
+        first.add_prompts("dev1", 5)
+        first.upgrade_tier("dev1", SubscriptionTier.BETA_OPERATOR, "cus_1")
+        first.close()
+
+        user = UserManager(tmp_path).get_user("dev1")
+        assert user is not None
+        assert user.prompts_remaining == 6
+        assert user.tier == SubscriptionTier.BETA_OPERATOR
+        assert user.stripe_customer_id == "cus_1"
+
+    def test_from_dict_round_trip(self) -> None:
+        user = UserProfile(device_id="dev1", tier=SubscriptionTier.EARLY_ACCESS)
+        data = json.loads(json.dumps(user.to_dict()))
+        assert data["tier"] == "early_access"
+        data["removed_field"] = 1
+        assert UserProfile.from_dict(data) == user
+
+    def test_large_context_stored_out_of_line(self, tmp_path: Path) -> None:
+        manager = UserManager(tmp_path)
+        context = "x" * (users_module.INLINE_CONTEXT_MAX_CHARS + 1)
+        manager.set_company_context("dev1", context)
+        manager.set_company_context("dev2", "short")
+        manager.close()
+
+        profile = json.loads((tmp_path / "users" / "de" / "dev1.json").read_text())
+        assert profile["company_context"] is None
+        assert (tmp_path / "contexts" / "dev1.txt").read_text() == context
+        assert not (tmp_path / "contexts" / "dev2.txt").exists()
+
+        reloaded = UserManager(tmp_path)
+        assert reloaded.get_company_context("dev1") == context
+        assert reloaded.get_company_context("dev2") == "short"
+        reloaded.close()
+
+        listed = UserManager(tmp_path)
+        contexts = {u.device_id: u.company_context for u in listed.list_users()}
+        assert contexts == {"dev1": context, "dev2": "short"}
+        listed.close()
+
+    def test_writes_leave_no_temp_files(self, manager: UserManager) -> None:
+        manager.add_prompts("dev1", 1)
+        manager.add_prompts("dev1", 1)
+        assert [p.name for p in (manager.users_dir / "de").iterdir()] == ["dev1.json"]
+
+    def test_migrates_flat_layout(self, tmp_path: Path) -> None:
+        users_dir = tmp_path / "users"
+        users_dir.mkdir()
+        profile = {"device_id": "abc123", "prompts_remaining": 7}
+        (users_dir / "abc123.json").write_text(json.dumps(profile))
+
+        manager = UserManager(tmp_path)
+        assert (users_dir / "ab" / "abc123.json").exists()
+        assert not (users_dir / "abc123.json").exists()
+        assert manager.get_prompts_remaining("abc123") == 7
+        manager.close()
+
+    def test_use_prompt(self, manager: UserManager) -> None:
+        assert manager.use_prompt("dev1") == (True, 0)
+        assert manager.use_prompt("dev1") == (False, 0)
+        assert manager.can_run_workflow("dev1") == (False, "no_prompts")
+
+    def test_early_access_tokens_unlimited(self, manager: UserManager) -> None:
+        manager.upgrade_tier("dev1", SubscriptionTier.EARLY_ACCESS)
+        assert manager.use_tokens("dev1", 50) == (True, 0)
+        user = manager.get_user("dev1")
+        assert user is not None
+        assert user.tokens_used_total == 50
+
+    def test_stats(self, manager: UserManager) -> None:
+        manager.get_or_create_user("dev1")
+        manager.upgrade_tier("dev2", SubscriptionTier.EARLY_ACCESS)
+        manager.use_prompt("dev1")
+        stats = manager.get_stats()
+        assert stats["total_users"] == 2
+        assert stats["tier_counts"]["tryout"] == 1
+        assert stats["tier_counts"]["early_access"] == 1
+        assert stats["total_prompts_used"] == 1
+        assert stats["transactions_count"] == 2
+        assert stats["active_last_24h"] == 2
+
+    def test_stats_track_later_writes(self, manager: UserManager) -> None:
+        manager.get_or_create_user("dev1")
+        assert manager.get_stats()["total_users"] == 1
+
+        manager.use_prompt("dev1")
+        manager.upgrade_tier("dev2", SubscriptionTier.EARLY_ACCESS)
+        stats = manager.get_stats()
+        assert stats["total_users"] == 2
+        assert stats["total_prompts_used"] == 1
+        assert stats["tier_counts"]["tryout"] == 1
+        assert stats["tier_counts"]["early_access"] == 1
+
+    def test_parallel_scan(self, manager: UserManager, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(users_module, "PARALLEL_SCAN_MIN_FILES", 2)
+        for i in range(5):
+            manager.add_prompts(f"dev{i}", i)
+        (manager.users_dir / "de" / "broken.json").write_text("{not json")
+        users = manager.list_users()
+        assert sorted(u.prompts_remaining for u in users) == [1, 2, 3, 4, 5]
+
+    def test_preload(self, tmp_path: Path) -> None:
+        first = UserManager(tmp_path)
+        first.get_or_create_user("dev1")
+        first.get_or_create_user("dev2")
+        first.close()
+
+        manager = UserManager(tmp_path)
+        assert manager.preload() == 2
+        assert manager.get_stats()["total_users"] == 2
+        manager.close()
+
+    def test_list_users_most_recent_first(self, manager: UserManager) -> None:
+        for i, device_id in enumerate(("dev1", "dev2", "dev3")):
+            manager.get_or_create_user(device_id, now=1000.0 + i)
+        manager.get_or_create_user("dev1", now=5000.0)
+        assert [u.device_id for u in manager.list_users(limit=2)] == ["dev1", "dev3"]
+
+    def test_stats_skip_unreadable_profiles(self, manager: UserManager) -> None:
+        manager.get_or_create_user("dev1")
+        (manager.users_dir / "de" / "broken.json").write_text("{not json")
+        (manager.users_dir / "de" / "notes.txt").write_text("ignored")
+        stats = manager.get_stats()
+        assert stats["total_users"] == 1
+        assert stats["transactions_count"] == 0
+
+
+class TestTransactions:
+    """Tests for the append-only transaction log."""
+
+    def test_most_recent_first(self, manager: UserManager) -> None:
+        for amount in (1, 2, 3):
+            manager.add_prompts("dev1", amount)
+        amounts = [t.amount for t in manager.get_transactions()]
+        assert amounts == [3, 2, 1]
+
+    def test_filter_and_limit(self, manager: UserManager) -> None:
+        for i in range(5):
+            manager.add_prompts("dev1", i)
+            manager.add_prompts("dev2", 100 + i)
+        transactions = manager.get_transactions(device_id="dev2", limit=2)
+        assert [t.amount for t in transactions] == [104, 103]
+        assert all(t.user_device_id == "dev2" for t in transactions)
+
+    def test_rotation(self, manager: UserManager, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(users_module, "MAX_TRANSACTIONS", 5)
+        for i in range(17):
+            manager.add_prompts("dev1", i)
+        transactions = manager.get_transactions(limit=100)
+        assert [t.amount for t in transactions] == list(range(16, 9, -1))
+        assert manager.get_stats()["transactions_count"] == 7
+        assert len(manager.get_transactions(device_id="dev1", limit=100)) == 17
+
+    def test_per_user_rotation(
+        self, manager: UserManager, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        manager.add_prompts("dev1", 0)
+        line_size = manager._user_transactions_path("dev1").stat().st_size
+        monkeypatch.setattr(users_module, "MAX_USER_TRANSACTION_BYTES", line_size * 5)
+        for i in range(1, 23):
+            manager.add_prompts("dev1", i)
+
+        current = manager._user_transactions_path("dev1")
+        previous = manager._previous_user_transactions_path("dev1")
+        assert current.stat().st_size + previous.stat().st_size <= line_size * 10
+        amounts = [t.amount for t in manager.get_transactions(device_id="dev1", limit=100)]
+        assert amounts == list(range(22, 22 - len(amounts), -1))
+        assert 5 <= len(amounts) <= 10
+
+    def test_close_keeps_logging(self, manager: UserManager) -> None:
+        manager.add_prompts("dev1", 1)
+        manager.close()
+        manager.add_prompts("dev1", 2)
+        assert [t.amount for t in manager.get_transactions()] == [2, 1]
+        manager.close()
+
+    def test_migrates_legacy_log(self, tmp_path: Path) -> None:
+        tokens_dir = tmp_path / "tokens"
+        tokens_dir.mkdir()
+        legacy = [
+            {"id": "a", "user_device_id": "dev1", "amount": 1, "reason": "r", "timestamp": 1.0},
+            {"id": "b", "user_device_id": "dev1", "amount": 2, "reason": "r", "timestamp": 2.0},
+        ]
+        (tokens_dir / "transactions.json").write_text(json.dumps(legacy))
+
+        manager = UserManager(tmp_path)
+        assert [t.id for t in manager.get_transactions()] == ["b", "a"]
+        assert [t.id for t in manager.get_transactions(device_id="dev1")] == ["b", "a"]
+        assert not (tokens_dir / "transactions.json").exists()
+
+    def test_per_user_log(self, manager: UserManager) -> None:
+        manager.add_prompts("dev1", 1)
+        manager.add_prompts("dev2", 2)
+        manager.transactions_path.unlink()
+        assert [t.amount for t in manager.get_transactions(device_id="dev2")] == [2]
+        assert manager.get_transactions(device_id="dev3") == []
+
+    def test_sanitize_device_id(self) -> None:
+        sanitize = users_module._sanitize_device_id
+        assert sanitize("abc-123_X/../y z") == "abc-123_Xyz"
+        assert sanitize("dév/ice") == "dévice"
+        assert len(sanitize("a" * 100)) == 64
+
+    def test_iter_lines_reversed(self, tmp_path: Path) -> None:
+        path = tmp_path / "log.jsonl"
+        path.write_bytes(b"one\ntwo\n\nthree\nfour")
+        assert list(users_module._iter_lines_reversed(path)) == [b"four", b"three", b"two", b"one"]
+        path.write_bytes(b"\nonly\n")
+        assert list(users_module._iter_lines_reversed(path)) == [b"only"]
+        path.write_bytes(b"")
+        assert list(users_module._iter_lines_reversed(path)) == []
+
+
+class TestProfileCache:
+    """Tests for the in-memory profile cache."""
+
+    def test_cached_instance(self, manager: UserManager) -> None:
+        user = manager.get_or_create_user("dev1")
+        assert manager.get_user("dev1") is user
+
+    def test_last_active_deferred_until_flush(self, tmp_path: Path) -> None:
+        manager = UserManager(tmp_path)
+        manager.get_or_create_user("dev1")
+        path = tmp_path / "users" / "de" / "dev1.json"
+        before = json.loads(path.read_text())["last_active"]
+
+        manager.get_or_create_user("dev1", now=before + 100)
+        assert json.loads(path.read_text())["last_active"] == before
+
+        manager.flush()
+        assert json.loads(path.read_text())["last_active"] == before + 100
+
+    def test_unlimited_usage_deferred(self, tmp_path: Path) -> None:
+        manager = UserManager(tmp_path)
+        manager.set_admin("dev1")
+        assert manager.use_prompt("dev1") == (True, -1)
+        path = tmp_path / "users" / "de" / "dev1.json"
+        assert json.loads(path.read_text())["prompts_used_total"] == 0
+
+        manager.close()
+        assert json.loads(path.read_text())["prompts_used_total"] == 1
+
+    def test_last_active_resolution(self, manager: UserManager) -> None:
+        manager.get_or_create_user("dev1", now=1000.0)
+        assert manager.get_or_create_user("dev1", now=1030.0).last_active == 1000.0
+        assert not manager._dirty
+        assert manager.get_or_create_user("dev1", now=1060.0).last_active == 1060.0
+        assert manager._dirty == {"dev1"}
+
+    def test_flush_when_many_dirty(
+        self, manager: UserManager, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setattr(users_module, "FLUSH_MAX_DIRTY", 3)
+        for device_id in ("dev1", "dev2", "dev3"):
+            manager.get_or_create_user(device_id, now=1000.0)
+        manager.get_or_create_user("dev1", now=2000.0)
+        manager.get_or_create_user("dev2", now=2000.0)
+        assert len(manager._dirty) == 2
+        manager.get_or_create_user("dev3", now=2000.0)
+        assert not manager._dirty
+
+    def test_failed_flush_stays_dirty(
+        self, manager: UserManager, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        manager.get_or_create_user("dev1", now=1000.0)
+        manager.get_or_create_user("dev2", now=1000.0)
+        manager.get_or_create_user("dev1", now=2000.0)
+        manager.get_or_create_user("dev2", now=2000.0)
+        write_user = manager._write_user
+
+        def failing_write(user: UserProfile) -> None:
+            if user.device_id == "dev1":
+                raise OSError("disk full")
+            write_user(user)
+
+        monkeypatch.setattr(manager, "_write_user", failing_write)
+        manager.flush()
+        assert manager._dirty == {"dev1"}
+
+        monkeypatch.setattr(manager, "_write_user", write_user)
+        manager.flush()
+        assert not manager._dirty
+        assert json.loads(manager._user_path("dev1").read_text())["last_active"] == 2000.0
+
+    def test_eviction_writes_dirty_user(
+        self, manager: UserManager, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setattr(users_module, "USER_CACHE_SIZE", 1)
+        manager.get_or_create_user("dev1", now=1000.0)
+        manager.get_or_create_user("dev1", now=2000.0)
+        manager.get_or_create_user("dev2")  # Evicts dev1
+        user = manager.get_user("dev1")
+        assert user is not None
+        assert user.last_active == 2000.0
+
+    def test_sees_write_from_other_manager(self, tmp_path: Path) -> None:
+        server = UserManager(tmp_path)
+        server.get_or_create_user("dev1", now=1000.0)
+
+        script = UserManager(tmp_path)
+        script.set_admin("dev1")
+        script.close()
+
+        assert server.is_admin("dev1")
+        server.close()
+
+    def test_flush_merges_instead_of_overwriting(self, tmp_path: Path) -> None:
+        # The script stamps last_active with the real clock; stay ahead of it
+        later = time.time() + 3600
+        server = UserManager(tmp_path)
+        server.get_or_create_user("dev1", now=1000.0)
+        server.get_or_create_user("dev1", now=later)  # Deferred last_active
+        assert server._dirty == {"dev1"}
+
+        script = UserManager(tmp_path)
+        script.set_admin("dev1")
+        script.close()
+
+        server.flush()
+        server.close()
+        reader = UserManager(tmp_path)
+        user = reader.get_user("dev1")
+        assert user is not None
+        assert user.is_admin
+        assert user.last_active == later
+        reader.close()
+
+    def test_stats_rebuilt_after_other_manager_writes(self, tmp_path: Path) -> None:
+        server = UserManager(tmp_path)
+        server.get_or_create_user("dev1")
+        assert server.get_stats()["total_users"] == 1
+
+        script = UserManager(tmp_path)
+        script.set_admin("dev2")
+        script.upgrade_tier("dev1", SubscriptionTier.EARLY_ACCESS)
+        script.close()
+
+        stats = server.get_stats()
+        assert stats["total_users"] == 2
+        assert stats["tier_counts"]["early_access"] == 1
+        assert {u.device_id for u in server.list_users()} == {"dev1", "dev2"}
+
+        # Own writes keep the index current without a rescan
+        server.get_or_create_user("dev3")
+        summaries = server._summaries
+        assert server.get_stats()["total_users"] == 3
+        assert server._summaries is summaries
+        server.close()